@@ -53,7 +53,7 @@ class RetrieverWithDynamicContext(BaseRetriever):
 
     async def aget_relevant_documents(self, query: str):
         dynamic_doc = Document(page_content=get_dynamic_context(), metadata={"source": "dynamic"})
-        docs = await self.retriever.get_relevant_documents(query)
+        docs = await self.retriever.aget_relevant_documents(query)
         return [dynamic_doc] + docs
 
 
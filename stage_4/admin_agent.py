@@ -1,8 +1,8 @@
 """Second agent (LangChain): formats reservation requests for the administrator."""
 from langchain.prompts import PromptTemplate
-from langchain.llms import OpenAI
 
 from config import OPENAI_MODEL
+from llm import get_llm
 
 
 def format_reservation_request_for_admin(request: dict) -> str:
@@ -19,7 +19,7 @@ Period: from {period_start} to {period_end}
 
 Write a short, clear summary (2-3 lines) for the admin to approve or refuse.""",
     )
-    llm = OpenAI(model=OPENAI_MODEL, temperature=0)
+    llm = get_llm(OPENAI_MODEL, temperature=0)
     return llm.predict(
         prompt.format(
             request_id=request["id"],
@@ -43,7 +43,7 @@ def parse_admin_response(admin_reply: str) -> str:
 
 Respond with exactly one word: approved or refused.""",
     )
-    llm = OpenAI(model=OPENAI_MODEL, temperature=0)
+    llm = get_llm(OPENAI_MODEL, temperature=0)
     out = llm.predict(prompt.format(reply=admin_reply)).strip().lower()
     if "approv" in out:
         return "approved"
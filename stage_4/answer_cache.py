@@ -0,0 +1,150 @@
+"""Semantic answer cache in front of the RAG chain (chatbot.get_reply).
+
+A question whose embedding is within ANSWER_CACHE_THRESHOLD (cosine similarity) of a
+cached one gets the cached answer, as long as the dynamic data it was answered from
+(hours, prices, availability) is unchanged, and both name the same numbers, weekdays,
+months and relative days: embeddings barely tell "open on Saturday?" from "open on
+Sunday?" or "2 hours" from "3 hours". Entries are evicted least recently used
+beyond ANSWER_CACHE_CAPACITY; a change of dynamic data drops them all.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from config import ANSWER_CACHE_CAPACITY, ANSWER_CACHE_THRESHOLD, OPENAI_EMBEDDING_MODEL
+
+
+def _normalize_question(text: str) -> str:
+    return " ".join((text or "").lower().split()).rstrip("?!. ")
+
+
+_SPECIFIC = re.compile(
+    r"\d+(?:[.,:]\d+)?|\b(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday|weekends?|"
+    r"january|february|march|april|may|june|july|august|september|october|november|december|"
+    r"today|tonight|tomorrow|yesterday)\b",
+    re.I,
+)
+
+
+def question_specifics(text: str) -> frozenset:
+    """Numbers and day/month words in a question; a semantic hit must name the same ones."""
+    return frozenset(m.lower().replace(",", ".") for m in _SPECIFIC.findall(text or ""))
+
+
+class SemanticAnswerCache:
+    def __init__(self, embed: Callable[[str], list] = None, capacity: int = ANSWER_CACHE_CAPACITY,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        if embed is None:
+            from langchain.embeddings.openai import OpenAIEmbeddings
+
+            embed = OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL).embed_query
+        self.embed = embed
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized question -> (unit vector, answer, specifics)
+        self._index = None  # (keys, stacked vectors), rebuilt lazily after adds/evictions
+        self._version = None
+        self._stats = {"hits": 0, "exact_hits": 0, "misses": 0, "evicted": 0, "invalidated": 0,
+                       "rejected": 0}
+
+    def _unit(self, text: str):
+        import numpy as np
+
+        v = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _check_version(self, version) -> None:
+        # Caller holds the lock.
+        if version != self._version:
+            self._stats["invalidated"] += len(self._entries)
+            self._entries.clear()
+            self._index = None
+            self._version = version
+
+    def lookup(self, question: str, version) -> tuple:
+        """(answer or None, query vector or None); pass the vector on to add() to avoid a second embedding."""
+        import numpy as np
+
+        key = _normalize_question(question)
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["exact_hits"] += 1
+                return self._entries[key][1], None
+            if not self._entries:
+                self._stats["misses"] += 1
+                return None, None
+        vector = self._unit(question)
+        with self._lock:
+            if version != self._version or not self._entries:
+                self._stats["misses"] += 1
+                return None, vector
+            if self._index is None:
+                self._index = (list(self._entries), np.stack([e[0] for e in self._entries.values()]))
+            keys, matrix = self._index
+            scores = matrix @ vector
+            specifics = question_specifics(question)
+            rejected = False
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                hit_key = keys[i]
+                if self._entries[hit_key][2] != specifics:
+                    rejected = True
+                    continue
+                self._entries.move_to_end(hit_key)
+                self._stats["hits"] += 1
+                return self._entries[hit_key][1], vector
+            self._stats["misses"] += 1
+            if rejected:
+                self._stats["rejected"] += 1
+            return None, vector
+
+    def add(self, question: str, answer: str, version, vector=None) -> None:
+        if self.capacity <= 0:
+            return
+        if vector is None:
+            vector = self._unit(question)
+        key = _normalize_question(question)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (vector, answer, question_specifics(question))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+            self._index = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), capacity=self.capacity, threshold=self.threshold)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Process-wide answer cache, or None when ANSWER_CACHE_CAPACITY is 0."""
+    global _cache
+    if ANSWER_CACHE_CAPACITY <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache()
+    return _cache
@@ -0,0 +1,686 @@
+"""Micro-benchmarks for Stage 4 components. Run via run_benchmark.py."""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+
+def _timed(fn, rounds: int) -> dict:
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"avg_seconds": sum(times) / len(times), "min_seconds": min(times), "max_seconds": max(times), "rounds": rounds}
+
+
+def bench_turn_setup(rounds: int = 5) -> dict:
+    """Per-turn setup cost: rebuilding pipeline + RAG chain every turn vs. the shared singletons."""
+    from chatbot import build_rag_chain
+    from graph import build_pipeline, get_pipeline, get_rag_chain, reset
+
+    def per_turn():
+        build_pipeline()
+        build_rag_chain()
+
+    def shared():
+        get_pipeline()
+        get_rag_chain()
+
+    before = _timed(per_turn, rounds)
+    reset()
+    start = time.perf_counter()
+    shared()
+    warmup_seconds = time.perf_counter() - start
+    after = _timed(shared, rounds)
+    return {"before": before, "after": after, "warmup_seconds": warmup_seconds}
+
+
+def _scratch_db(name: str):
+    """Fresh tuned connection on a throwaway file, so benchmarks never touch SQLITE_PATH."""
+    import sqlite3
+    from db import _configure_connection
+
+    path = os.path.join(tempfile.mkdtemp(prefix="parking_bench_"), name)
+    conn = sqlite3.connect(path)
+    _configure_connection(conn)
+    return conn, path
+
+
+@contextmanager
+def _use_connection(conn):
+    """Point db's per-thread connection at a scratch database for the duration of a benchmark."""
+    import db
+
+    saved = getattr(db._local, "conn", None), getattr(db._local, "depth", 0)
+    db._local.conn, db._local.depth = conn, 0
+    try:
+        yield
+    finally:
+        db._local.conn, db._local.depth = saved
+
+
+@contextmanager
+def _use_sqlite_path(path: str):
+    """Point db.SQLITE_PATH at a scratch file, so every thread's connection opens it."""
+    import db
+
+    saved = db.SQLITE_PATH
+    db.close_connection()
+    db.SQLITE_PATH = path
+    try:
+        yield
+    finally:
+        db.close_connection()
+        db.SQLITE_PATH = saved
+
+
+def _fill_availability(conn, spaces: int, days: int, start: date = None):
+    start = start or date.today()
+    rows = (
+        (space_id, (start + timedelta(days=d)).isoformat(), hour, 1 if (space_id + d + hour) % 3 else 0)
+        for space_id in range(1, spaces + 1)
+        for d in range(days)
+        for hour in range(24)
+    )
+    conn.executemany(
+        "INSERT INTO availability (space_id, slot_date, hour_slot, available) VALUES (?, ?, ?, ?)", rows
+    )
+    conn.commit()
+
+
+def bench_availability_indexes(rows: int = 1_000_000, requests: int = 100_000, rounds: int = 20) -> dict:
+    """Summary and pending-queue queries on the base schema vs. after all migrations."""
+    from db import migrate
+
+    conn, path = _scratch_db("indexes.db")
+    migrate(conn, target=1)
+    spaces = 450
+    days = max(1, -(-rows // (spaces * 24)))
+    _fill_availability(conn, spaces, days)
+    conn.executemany(
+        """INSERT INTO reservation_requests
+           (name, surname, car_number, period_start, period_end, status, created_at)
+           VALUES ('N', 'S', ?, '', '', ?, ?)""",
+        ((f"CAR-{i}", "pending" if i % 50 == 0 else "approved", f"2025-01-01T00:00:{i:09d}") for i in range(requests)),
+    )
+    conn.commit()
+    target_date = (date.today() + timedelta(days=days // 2)).isoformat()
+    summary_sql = "SELECT COUNT(*) FROM availability WHERE slot_date = ? AND available = 1"
+    total_sql = "SELECT COUNT(*) FROM availability WHERE slot_date = ?"
+    pending_sql = "SELECT id, car_number, created_at FROM reservation_requests WHERE status = 'pending' ORDER BY created_at"
+
+    def summary():
+        conn.execute(summary_sql, (target_date,)).fetchone()
+        conn.execute(total_sql, (target_date,)).fetchone()
+
+    def pending():
+        conn.execute(pending_sql).fetchall()
+
+    def measure():
+        plans = conn.execute("EXPLAIN QUERY PLAN " + summary_sql, (target_date,)).fetchall()
+        plans += conn.execute("EXPLAIN QUERY PLAN " + pending_sql).fetchall()
+        return {"summary": _timed(summary, rounds), "pending": _timed(pending, rounds), "plans": [r[-1] for r in plans]}
+
+    result = {"availability_rows": spaces * days * 24, "requests": requests, "path": path}
+    result["before"] = measure()
+    start = time.perf_counter()
+    migrate(conn)
+    result["migrate_seconds"] = time.perf_counter() - start
+    result["after"] = measure()
+    conn.close()
+    return result
+
+
+def bench_seed(spaces: int = 450, days: int = 365, baseline_days: int = 7) -> dict:
+    """Seed throughput of seed_availability() vs. the old one-execute-per-row loop."""
+    from db import migrate, seed_availability
+
+    conn, path = _scratch_db("seed_loop.db")
+    migrate(conn)
+    today = date.today()
+    start = time.perf_counter()
+    for space_id in range(1, spaces + 1):
+        for d in range(baseline_days):
+            slot_date = (today + timedelta(days=d)).isoformat()
+            for hour in range(24):
+                conn.execute(
+                    "INSERT INTO availability (space_id, slot_date, hour_slot, available) VALUES (?, ?, ?, ?)",
+                    (space_id, slot_date, hour, 1),
+                )
+    conn.commit()
+    loop_seconds = time.perf_counter() - start
+    loop_rows = spaces * baseline_days * 24
+    conn.close()
+
+    conn, path = _scratch_db("seed_bulk.db")
+    migrate(conn)
+    bulk = seed_availability(conn, spaces=spaces, days=days, start=today)
+    conn.commit()
+    conn.close()
+    return {
+        "loop": {"rows": loop_rows, "seconds": loop_seconds, "rows_per_second": loop_rows / loop_seconds},
+        "bulk": bulk,
+        "path": path,
+    }
+
+
+def bench_layouts(spaces: int = 450, days: int = 90, rounds: int = 50) -> dict:
+    """Row-per-hour vs. bit-packed layout: size, day summary and 09:00-17:00 free-space query."""
+    import db
+
+    results = {}
+    target = (date.today() + timedelta(days=days // 2)).isoformat()
+    for layout in db.AVAILABILITY_LAYOUTS:
+        conn, path = _scratch_db(f"layout_{layout}.db")
+        db.migrate(conn)
+        db._set_availability_layout(conn, layout)
+        seed = db.seed_availability(conn, spaces=spaces, days=days)
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        with _use_connection(conn):
+            results[layout] = {
+                "rows": seed["rows"],
+                "file_bytes": os.path.getsize(path),
+                "summary": _timed(lambda: db.get_availability_summary(target), rounds),
+                "range": _timed(lambda: db.get_spaces_free_between(target, 9, 17), rounds),
+            }
+        conn.close()
+    return results
+
+
+def bench_free_spaces(spaces: int = 450, days: int = 30, period_days: int = 3, rounds: int = 20) -> dict:
+    """find_free_spaces() for a multi-day period, with and without a space_type filter, per layout."""
+    import db
+    from datetime import datetime
+
+    start = datetime.combine(date.today() + timedelta(days=1), datetime.min.time()).replace(hour=9)
+    end = start + timedelta(days=period_days, hours=8)
+    results = {}
+    for layout in db.AVAILABILITY_LAYOUTS:
+        conn, _ = _scratch_db(f"free_{layout}.db")
+        db.migrate(conn)
+        db._set_availability_layout(conn, layout)
+        db._seed_parking_spaces(conn, spaces)
+        db.seed_availability(conn, spaces=spaces, days=days)
+        # Occupy a band of spaces in the middle of the period so the answer is not trivial.
+        mid = (start + timedelta(days=1)).date().isoformat()
+        if layout == "bitmask":
+            conn.execute("UPDATE availability_days SET free_mask = 0 WHERE slot_date = ? AND space_id % 4 = 0", (mid,))
+        else:
+            conn.execute("UPDATE availability SET available = 0 WHERE slot_date = ? AND space_id % 4 = 0", (mid,))
+        conn.commit()
+        with _use_connection(conn):
+            results[layout] = {
+                "free": len(db.find_free_spaces(start, end)),
+                "any": _timed(lambda: db.find_free_spaces(start, end), rounds),
+                "typed": _timed(lambda: db.find_free_spaces(start, end, space_type="wide"), rounds),
+            }
+        conn.close()
+    return {"period": f"{start} to {end}", "layouts": results}
+
+
+def bench_approvals(threads: int = 16, requests: int = 800, spaces: int = 20, seed: int = 7) -> dict:
+    """Many threads approving overlapping requests at once; counts double bookings (expected: 0)."""
+    import random
+    import threading
+    from datetime import datetime
+
+    import db
+
+    conn, path = _scratch_db("approvals.db")
+    conn.close()
+    with _use_sqlite_path(path):
+        db.init_db(spaces=spaces, days=3)
+        rng = random.Random(seed)
+        base = datetime.combine(date.today(), datetime.min.time())
+        ids = []
+        for _ in range(requests):
+            start = base + timedelta(hours=rng.randrange(0, 48))
+            end = start + timedelta(hours=rng.randrange(1, 12))
+            ids.append(db.create_reservation_request("N", "S", "CAR", start.isoformat(sep=" "), end.isoformat(sep=" ")))
+        db.close_connection()
+
+        counts = {"approved": 0, "conflicts": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def worker(chunk):
+            local = {"approved": 0, "conflicts": 0, "errors": 0}
+            for rid in chunk:
+                try:
+                    db.set_reservation_status(rid, "approved")
+                    local["approved"] += 1
+                except db.ReservationConflictError:
+                    local["conflicts"] += 1
+                except Exception:
+                    local["errors"] += 1
+            db.close_connection()
+            with lock:
+                for k, v in local.items():
+                    counts[k] += v
+
+        rng.shuffle(ids)
+        pool = [threading.Thread(target=worker, args=(ids[i::threads],)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        seconds = time.perf_counter() - start
+
+        with db.db_session() as c:
+            approved = c.execute(
+                "SELECT space_id, period_start, period_end FROM reservation_requests WHERE status = 'approved'"
+            ).fetchall()
+            taken = c.execute("SELECT COUNT(*) FROM availability WHERE available = 0").fetchone()[0]
+
+    by_space = {}
+    for space_id, ps, pe in approved:
+        by_space.setdefault(space_id, []).append(db._period_to_slots(ps, pe))
+    double_bookings = 0
+    for periods in by_space.values():
+        periods.sort()
+        double_bookings += sum(1 for a, b in zip(periods, periods[1:]) if b[0] < a[1])
+    claimed_hours = sum((e - s).total_seconds() // 3600 for periods in by_space.values() for s, e in periods)
+    return {
+        **counts,
+        "threads": threads,
+        "seconds": seconds,
+        "decisions_per_second": requests / seconds,
+        "approvals_per_second": counts["approved"] / seconds,
+        "double_bookings": double_bookings,
+        "slots_consistent": taken == claimed_hours,
+    }
+
+
+def bench_bulk_decisions(decisions: int = 10_000, single: int = 1_000, spaces: int = 450, seed: int = 11) -> dict:
+    """One transaction + one file append per decision vs. set_reservation_statuses() + one batch write."""
+    import random
+    from datetime import datetime
+
+    import db
+    import reservation_writer
+
+    rng = random.Random(seed)
+    base = datetime.combine(date.today(), datetime.min.time())
+    periods = []
+    for _ in range(decisions):
+        start = base + timedelta(hours=rng.randrange(0, 6 * 24))
+        periods.append((start, start + timedelta(hours=rng.randrange(1, 5))))
+    statuses = ["approved" if rng.random() < 0.8 else "refused" for _ in range(decisions)]
+
+    saved = reservation_writer.CONFIRMED_RESERVATIONS_FILE, reservation_writer.RESERVATION_SERVER_URL
+    results = {}
+    try:
+        reservation_writer.RESERVATION_SERVER_URL = ""
+        for mode, count in (("single", min(single, decisions)), ("bulk", decisions)):
+            conn, path = _scratch_db(f"decisions_{mode}.db")
+            conn.close()
+            reservation_writer.CONFIRMED_RESERVATIONS_FILE = os.path.join(os.path.dirname(path), "confirmed.txt")
+            with _use_sqlite_path(path):
+                db.init_db(spaces=spaces, days=7)
+                ids = [
+                    db.create_reservation_request("N", "S", f"CAR-{i}", s.isoformat(sep=" "), e.isoformat(sep=" "))
+                    for i, (s, e) in enumerate(periods[:count])
+                ]
+                start = time.perf_counter()
+                if mode == "single":
+                    for rid, status in zip(ids, statuses):
+                        try:
+                            db.set_reservation_status(rid, status)
+                        except db.ReservationConflictError:
+                            continue
+                        if status == "approved":
+                            info = db.get_reservation_status(rid)
+                            reservation_writer.notify_confirmed_reservation(
+                                {"name": "N", "surname": "S", "car_number": "CAR", **info}, datetime.utcnow().isoformat()
+                            )
+                else:
+                    decided, _ = db.set_reservation_statuses(zip(ids, statuses, [""] * count))
+                    reservation_writer.notify_confirmed_reservations(
+                        [{**r, "approval_time": r["decided_at"]} for r in decided if r["status"] == "approved"]
+                    )
+                seconds = time.perf_counter() - start
+            results[mode] = {"decisions": count, "seconds": seconds, "per_second": count / seconds}
+    finally:
+        reservation_writer.CONFIRMED_RESERVATIONS_FILE, reservation_writer.RESERVATION_SERVER_URL = saved
+    return results
+
+
+def bench_reservation_periods(reservations: int = 1_000_000, rounds: int = 20, seed: int = 13) -> dict:
+    """Overlap / per-car queries: text parsing scan vs. epoch-column scan vs. R*Tree (find_reservations)."""
+    import random
+    from datetime import datetime
+
+    import db
+
+    rng = random.Random(seed)
+    conn, path = _scratch_db("periods.db")
+    db.migrate(conn)
+    base = datetime(2025, 1, 1)
+    cars = [f"AB-{i:04d}-CD" for i in range(reservations // 10 or 1)]
+
+    def rows():
+        for _ in range(reservations):
+            start = base + timedelta(hours=rng.randrange(0, 365 * 24))
+            end = start + timedelta(hours=rng.randrange(1, 48))
+            ps, pe = start.isoformat(sep=" ", timespec="minutes"), end.isoformat(sep=" ", timespec="minutes")
+            car = rng.choice(cars)
+            yield ("N", "S", car, ps, pe, "approved" if rng.random() < 0.7 else "refused", "2025-01-01T00:00:00",
+                   *db.period_epochs(start, end), db.car_key(car))
+
+    t0 = time.perf_counter()
+    conn.executemany(
+        """INSERT INTO reservation_requests
+           (name, surname, car_number, period_start, period_end, status, created_at,
+            period_start_ts, period_end_ts, car_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        rows(),
+    )
+    conn.commit()
+    load_seconds = time.perf_counter() - t0
+
+    at = datetime(2025, 6, 14, 10, 0)  # a Saturday, 10:00
+    at_ts = db.period_epochs(at, at + timedelta(seconds=1))[0]
+    car = cars[len(cars) // 2]
+    window = (datetime(2025, 6, 1), datetime(2025, 7, 1))
+
+    def text_scan():
+        hits = 0
+        for ps, pe in conn.execute(
+            "SELECT period_start, period_end FROM reservation_requests WHERE status = 'approved'"
+        ):
+            s, e = db.parse_period_datetime(ps), db.parse_period_datetime(pe)
+            if s and e and s <= at < e:
+                hits += 1
+        return hits
+
+    def epoch_scan():
+        return conn.execute(
+            """SELECT COUNT(*) FROM reservation_requests
+               WHERE status = 'approved' AND period_start_ts <= ? AND period_end_ts > ?""",
+            (at_ts, at_ts),
+        ).fetchone()[0]
+
+    with _use_connection(conn):
+        covering = len(db.find_reservations(at, at))
+        result = {
+            "reservations": reservations,
+            "load_seconds": load_seconds,
+            "covering_at": covering,
+            "text_scan": _timed(text_scan, 1),
+            "epoch_scan": _timed(epoch_scan, rounds),
+            "rtree_at": _timed(lambda: db.find_reservations(at, at), rounds),
+            "rtree_car_window": _timed(lambda: db.find_reservations(*window, car_number=car, status=None), rounds),
+            "scan_car_window": _timed(lambda: conn.execute(
+                """SELECT id FROM reservation_requests
+                   WHERE car_number = ? AND period_start_ts < ? AND period_end_ts > ?""",
+                (car, *db.period_epochs(*window)[::-1]),
+            ).fetchall(), rounds),
+        }
+        result["covering_at_scan"] = epoch_scan()
+    conn.close()
+    return result
+
+
+@contextmanager
+def _stub_openai_server():
+    """Local HTTP/1.1 server answering OpenAI completion calls instantly; counts TCP connections."""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    stats = {"connections": 0, "requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with lock:
+                stats["connections"] += 1
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                stats["requests"] += 1
+            usage = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            if self.path.endswith("/chat/completions"):
+                choice = {"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}
+            else:
+                choice = {"index": 0, "text": "ok", "logprobs": None, "finish_reason": "stop"}
+            body = json.dumps({"id": "stub", "object": "stub", "created": 0, "model": "stub",
+                               "choices": [choice], "usage": usage}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1", stats
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_llm_clients(calls: int = 200, threads: int = 4) -> dict:
+    """Per-call OpenAI client + fresh connection (old code) vs. the shared get_llm() client and pool."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import langchain
+    import openai
+    from langchain.llms import OpenAI
+    from openai import api_requestor
+
+    import llm
+    from config import OPENAI_MODEL
+    from llm import get_llm, reset_llm_clients
+
+    def per_call():
+        llm = OpenAI(model=OPENAI_MODEL, temperature=0)
+        llm.predict("ping")
+        # Drop the connection state, as a client built and discarded per call does.
+        session = api_requestor._thread_context.__dict__.pop("session", None)
+        if session is not None:
+            session.close()
+
+    def shared():
+        get_llm(OPENAI_MODEL, temperature=0).predict("ping")
+
+    saved = openai.api_base, openai.api_key, openai.requestssession
+    saved_cache = langchain.llm_cache, llm.install_llm_cache
+    # Measure the transport, not the completion cache: every call must reach the stub.
+    langchain.llm_cache, llm.install_llm_cache = None, lambda: None
+    result = {"calls": calls, "threads": threads}
+    try:
+        for label, fn in (("per_call", per_call), ("shared", shared)):
+            reset_llm_clients()
+            with _stub_openai_server() as (url, stats):
+                openai.api_base, openai.api_key = url, "sk-stub"
+                fn()  # warm imports / first connection outside the timing
+                stats["connections"] = 0
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    for f in [pool.submit(fn) for _ in range(calls)]:
+                        f.result()
+                seconds = time.perf_counter() - start
+                result[label] = {"seconds": seconds, "ms_per_call": seconds / calls * 1000,
+                                 "connections": stats["connections"]}
+        result["construct"] = _timed(lambda: OpenAI(model=OPENAI_MODEL, temperature=0), 50)
+        result["lookup"] = _timed(lambda: get_llm(OPENAI_MODEL, temperature=0), 50)
+    finally:
+        reset_llm_clients()
+        openai.api_base, openai.api_key, openai.requestssession = saved
+        langchain.llm_cache, llm.install_llm_cache = saved_cache
+    return result
+
+
+# Paraphrase groups: questions in a group should share an answer, across groups they must not.
+PARAPHRASES = [
+    ["What are your working hours?", "What are your hours?", "When are you open?", "What time do you open?",
+     "Opening hours?", "Until what time are you open today?"],
+    ["Where is the parking located?", "Where are you?", "What is the address of the garage?",
+     "Where is Central Garage?", "How do I find the parking?"],
+    ["How much does parking cost?", "How much is it?", "What are your prices?", "What is the hourly rate?",
+     "How much for a day of parking?"],
+    ["How do I book a space?", "How can I make a reservation?", "Can I reserve a parking spot?",
+     "How do reservations work?"],
+    ["Are there EV charging spaces?", "Can I charge my electric car?", "Do you have chargers for electric vehicles?"],
+]
+
+
+# Questions that embed almost identically but need different answers (a number, weekday or day differs).
+NEAR_MISSES = [
+    ["Are you open on Saturday?", "Are you open on Sunday?"],
+    ["How much is parking for 2 hours?", "How much is parking for 3 hours?"],
+    ["What time do you close on Friday?", "What time do you close on Monday?"],
+    ["Is there a free space today?", "Is there a free space tomorrow?"],
+    ["Are you open on 1 January?", "Are you open on 1 May?"],
+    ["How much for 1 day of parking?", "How much for 7 days of parking?"],
+]
+
+
+def bench_answer_cache(threshold: float = None, capacity: int = 500, passes: int = 2, seed: int = 17) -> dict:
+    """Replay shuffled paraphrases through the semantic answer cache (real embeddings, stub answers).
+
+    A hit whose answer comes from another paraphrase group counts as wrong. Every NEAR_MISSES
+    question is a group of its own, so a hit on one of them is always wrong (near_miss_wrong_hits).
+    """
+    import random
+
+    from answer_cache import SemanticAnswerCache
+    from config import ANSWER_CACHE_THRESHOLD
+
+    cache = SemanticAnswerCache(capacity=capacity,
+                                threshold=ANSWER_CACHE_THRESHOLD if threshold is None else threshold)
+    questions = [(q, group) for group, qs in enumerate(PARAPHRASES) for q in qs]
+    near_misses = {q for pair in NEAR_MISSES for q in pair}
+    questions += [(q, len(PARAPHRASES) + i) for i, q in enumerate(sorted(near_misses))]
+    rng = random.Random(seed)
+    wrong = near_miss_wrong = 0
+    lookup_times = []
+    for _ in range(passes):
+        rng.shuffle(questions)
+        for question, group in questions:
+            start = time.perf_counter()
+            answer, vector = cache.lookup(question, "v1")
+            lookup_times.append(time.perf_counter() - start)
+            if answer is None:
+                cache.add(question, f"answer for group {group}", "v1", vector=vector)
+            elif answer != f"answer for group {group}":
+                wrong += 1
+                near_miss_wrong += question in near_misses
+    stats = cache.stats()
+    stats.update(questions=len(questions) * passes, wrong_hits=wrong, near_miss_wrong_hits=near_miss_wrong,
+                 avg_lookup_ms=sum(lookup_times) / len(lookup_times) * 1000)
+    return stats
+
+
+# Realistic chatbot traffic (status questions excluded: they are answered before extraction).
+# Second item: the reservation the message fully specifies, else None.
+TRANSCRIPT = [
+    ("Hi!", None),
+    ("Where is the parking located?", None),
+    ("What are your working hours?", None),
+    ("How much does parking cost?", None),
+    ("How much is parking tomorrow?", None),
+    ("Do you have EV charging?", None),
+    ("How do I book a space?", None),
+    ("Is the garage open on Sunday?", None),
+    ("Thanks, that's all.", None),
+    ("Can I pay by card?", None),
+    ("What is the address?", None),
+    ("Is there a height limit for vans?", None),
+    ("My name is John Smith, car AB-123-CD, from 2025-02-22 09:00 to 2025-02-22 17:00",
+     ("John", "Smith", "AB-123-CD", "2025-02-22 09:00", "2025-02-22 17:00")),
+    ("Hi, I'm Ana Petrović. I'd like to book a space tomorrow from 9am to 5pm for my car BG 1234 AB",
+     ("Ana", "Petrović", "BG 1234 AB", "2025-02-21 09:00", "2025-02-21 17:00")),
+    ("Name: Marko, surname: Jovanović, plate NS-045-KL, 22.02.2025 08:00 - 24.02.2025 18:30",
+     ("Marko", "Jovanović", "NS-045-KL", "2025-02-22 08:00", "2025-02-24 18:30")),
+    ("I want to reserve for February 25th 10:00 to 14:30. My name is Lena Novak, registration number is ZG 555 AA",
+     ("Lena", "Novak", "ZG 555 AA", "2025-02-25 10:00", "2025-02-25 14:30")),
+    ("Please book Monday 7:30 to 19:00, this is Ivan Horvat, car M-AB 123",
+     ("Ivan", "Horvat", "M-AB 123", "2025-02-24 07:30", "2025-02-24 19:00")),
+    ("from 22:00 to 06:00 on 2025-03-01, my name is Tom Jones and the car is LJ 12-ABC",
+     ("Tom", "Jones", "LJ 12-ABC", "2025-03-01 22:00", "2025-03-02 06:00")),
+    ("I'd like to reserve a spot for Saturday", None),
+    ("hi my name is john", None),
+    ("book me in for 1 March please, car KG 777 XY", None),
+    ("Reservation: Petra Kovač, NI 321 BC, 2025-02-27T08:00 to 2025-02-27T12:00", None),
+]
+
+
+def bench_extraction(rounds: int = 100) -> dict:
+    """LLM extraction calls before (one per message) vs. with the rule-based fast path."""
+    from extraction import extract_reservation_rules, needs_llm_extraction
+
+    fields = ["name", "surname", "car_number", "period_start", "period_end"]
+    today = date(2025, 2, 20)  # a Thursday; "tomorrow" in TRANSCRIPT is 2025-02-21
+    counts = {"rules": 0, "skipped": 0, "llm": 0, "correct": 0, "expected": 0}
+    for message, expected in TRANSCRIPT:
+        result = extract_reservation_rules(message, today)
+        if needs_llm_extraction(message, result, fields, today):
+            counts["llm"] += 1
+        elif all(result.get(f) for f in fields):
+            counts["rules"] += 1
+        else:
+            counts["skipped"] += 1
+        if expected:
+            counts["expected"] += 1
+            counts["correct"] += tuple(result.get(f) for f in fields) == expected
+    timing = _timed(lambda: [extract_reservation_rules(m, today) for m, _ in TRANSCRIPT], rounds)
+    return {"messages": len(TRANSCRIPT), "llm_calls_before": len(TRANSCRIPT), "llm_calls_after": counts["llm"],
+            **counts, "per_message_ms": timing["avg_seconds"] / len(TRANSCRIPT) * 1000}
+
+
+def bench_speculative(extract_ms: float = 600, rag_ms: float = 1200, rounds: int = 5) -> dict:
+    """Full-path turn latency and LLM calls, extraction then RAG vs. both at once, with simulated LLM delays.
+
+    The question needs LLM extraction but holds no reservation; the reservation is complete after the LLM.
+    """
+    import chatbot
+    from db import init_db
+
+    calls = {"extract": 0, "rag": 0}
+    reservation = {"name": "Ana", "surname": "Petrović", "car_number": "BG 123 AB",
+                   "period_start": "2030-01-02 09:00", "period_end": "2030-01-02 12:00"}
+
+    def fake_extract(text):
+        calls["extract"] += 1
+        time.sleep(extract_ms / 1000)
+        return dict(reservation) if "Ana" in text else {}
+
+    def fake_reply(rag, user_message, on_token=None, use_cache=True):
+        calls["rag"] += 1
+        time.sleep(rag_ms / 1000)
+        return "answer"
+
+    messages = {
+        "question": "I'd like to reserve a spot for Saturday, how does it work?",
+        "reservation": "I'd like to reserve a spot for Saturday, I'm Ana Petrović",
+    }
+    saved = chatbot.extract_reservation_with_llm, chatbot.get_reply
+    chatbot.extract_reservation_with_llm, chatbot.get_reply = fake_extract, fake_reply
+    result = {"extract_ms": extract_ms, "rag_ms": rag_ms}
+    try:
+        with _use_sqlite_path(_scratch_db("speculative.db")[1]):
+            init_db()
+            for speculative in (False, True):
+                label = "speculative" if speculative else "serial"
+                result[label] = {}
+                for kind, message in messages.items():
+                    calls.update(extract=0, rag=0)
+                    timing = _timed(lambda: chatbot.submit_or_answer(None, message, speculative=speculative), rounds)
+                    result[label][kind] = {**timing, "llm_calls": (calls["extract"] + calls["rag"]) / rounds}
+    finally:
+        chatbot.extract_reservation_with_llm, chatbot.get_reply = saved
+    return result
@@ -1,45 +1,65 @@
 """RAG chatbot (first agent) + escalation to admin (same as stage_3)."""
+import asyncio
+import queue
 import re
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.prompts import PromptTemplate
-from langchain.llms import OpenAI
 from langchain.chains import RetrievalQA
 from langchain.schema import BaseRetriever, Document
 
-from config import OPENAI_MODEL
+from config import OPENAI_MODEL, SPECULATIVE_RAG_ENABLED
+from llm import get_llm
+from answer_cache import get_answer_cache
+from extraction import NAME_PATTERNS, extract_reservation_rules, find_plate, merge_llm_extraction, needs_llm_extraction
 from db import (
-    get_working_hours,
-    get_prices,
-    get_availability_summary,
+    get_dynamic_snapshot,
+    get_data_version,
     create_reservation_request,
     get_reservation_status,
+    find_free_spaces,
+    find_open_reservation_request,
+    period_epochs,
+    get_reservations_by_car,
+    run_in_db_thread,
 )
 from vector_store import get_vector_store
 from datetime import date
 
 
-def get_dynamic_context() -> str:
+# Per-thread because get_data_version() is tied to the thread's connection.
+_dynamic_context_cache = threading.local()
+
+
+def _format_dynamic_context(snapshot: dict) -> str:
     lines = ["## Dynamic data (current)\n"]
+    hours = snapshot["working_hours"]
+    lines.append("Working hours: " + "; ".join(f"{h['day']} {h['open']}-{h['close']}" for h in hours))
+    prices = snapshot["prices"]
+    lines.append("Prices: " + "; ".join(
+        f"{p['type']}: first hour {p['first_hour']} EUR, then {p['next_hours']} EUR/h, day max {p['day_max']} EUR"
+        for p in prices
+    ))
+    avail = snapshot["availability"]
+    lines.append(f"Availability today ({avail['date']}): {avail['available']} of {avail['total']} slots free.")
+    return "\n".join(lines)
+
+
+def get_dynamic_context() -> str:
+    """Formatted dynamic data; re-queried only when the date or the DB contents change."""
+    today = date.today().isoformat()
     try:
-        hours = get_working_hours()
-        lines.append("Working hours: " + "; ".join(f"{h['day']} {h['open']}-{h['close']}" for h in hours))
-    except Exception as e:
-        lines.append(f"Error getting working hours: {e}")
-    try:
-        prices = get_prices()
-        lines.append("Prices: " + "; ".join(
-            f"{p['type']}: first hour {p['first_hour']} EUR, then {p['next_hours']} EUR/h, day max {p['day_max']} EUR"
-            for p in prices
-        ))
-    except Exception as e:
-        lines.append(f"Error getting prices: {e}")
-    try:
-        today = date.today().isoformat()
-        avail = get_availability_summary(today)
-        lines.append(f"Availability today ({today}): {avail['available']} of {avail['total']} slots free.")
+        key = (today, get_data_version())
+        if getattr(_dynamic_context_cache, "key", None) == key:
+            return _dynamic_context_cache.text
+        text = _format_dynamic_context(get_dynamic_snapshot(today))
     except Exception as e:
-        lines.append(f"Error getting availability: {e}")
-    return "\n".join(lines)
+        return f"## Dynamic data (current)\n\nError getting dynamic data: {e}"
+    _dynamic_context_cache.key = key
+    _dynamic_context_cache.text = text
+    return text
 
 
 class RetrieverWithDynamicContext(BaseRetriever):
@@ -52,13 +72,17 @@ class RetrieverWithDynamicContext(BaseRetriever):
         return [dynamic_doc] + docs
 
     async def aget_relevant_documents(self, query: str):
-        dynamic_doc = Document(page_content=get_dynamic_context(), metadata={"source": "dynamic"})
-        docs = await self.retriever.get_relevant_documents(query)
-        return [dynamic_doc] + docs
+        # Vector search and the SQLite snapshot run concurrently; DB work stays off the event loop.
+        context, docs = await asyncio.gather(
+            run_in_db_thread(get_dynamic_context),
+            self.retriever.aget_relevant_documents(query),
+        )
+        return [Document(page_content=context, metadata={"source": "dynamic"})] + docs
 
 
 def build_rag_chain():
-    llm = OpenAI(model=OPENAI_MODEL, temperature=0)
+    # Streaming client: tokens reach callbacks as they arrive (see stream_reply); run() still returns the whole text.
+    llm = get_llm(OPENAI_MODEL, temperature=0, streaming=True)
     vectorstore = get_vector_store()
     base_retriever = vectorstore.as_retriever()
     retriever = RetrieverWithDynamicContext(retriever=base_retriever)
@@ -79,14 +103,168 @@ Helpful Answer:""",
     return RetrievalQA.from_llm(llm=llm, prompt=prompt, retriever=retriever)
 
 
-def get_reply(rag, user_message: str) -> str:
-    return rag.run(query=user_message)
+_rag_chain = None
+_rag_chain_lock = threading.Lock()
+
+
+def get_rag_chain():
+    """Process-wide RAG chain: built on first use, then shared by every turn."""
+    global _rag_chain
+    if _rag_chain is None:
+        with _rag_chain_lock:
+            if _rag_chain is None:
+                _rag_chain = build_rag_chain()
+    return _rag_chain
+
+
+def reset_rag_chain() -> None:
+    """Drop the shared chain (e.g. after re-ingest); the next call rebuilds it."""
+    global _rag_chain
+    with _rag_chain_lock:
+        _rag_chain = None
+
+
+class _TokenCallback(BaseCallbackHandler):
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.on_token(token)
+
+
+def _answer_cache_for(user_message: str, use_cache: bool):
+    # Messages naming a person or a car get personal replies: never served from or stored in the cache.
+    if not use_cache or find_plate(user_message) or any(p.search(user_message) for p in NAME_PATTERNS):
+        return None
+    return get_answer_cache()
+
+
+def get_reply(rag, user_message: str, on_token: Callable[[str], None] = None, use_cache: bool = True) -> str:
+    """RAG answer, reused from the semantic answer cache for near-duplicate questions.
+
+    on_token, if given, receives the LLM tokens as they are generated (not called for cached answers).
+    Graph nodes other than faq pass use_cache=False: their fallbacks answer personal requests.
+    """
+    callbacks = [_TokenCallback(on_token)] if on_token else None
+    cache = _answer_cache_for(user_message, use_cache)
+    if cache is None:
+        return rag.run(query=user_message, callbacks=callbacks)
+    # The formatted dynamic data is the version: answers never outlive the data they quote.
+    version = get_dynamic_context()
+    cached, vector = cache.lookup(user_message, version)
+    if cached is not None:
+        return cached
+    reply = rag.run(query=user_message, callbacks=callbacks)
+    cache.add(user_message, reply, version, vector=vector)
+    return reply
+
+
+async def aget_reply(rag, user_message: str, on_token: Callable[[str], None] = None, use_cache: bool = True) -> str:
+    """get_reply() for the event loop: async retrieval and LLM call, blocking cache work on threads."""
+    callbacks = [_TokenCallback(on_token)] if on_token else None
+    cache = _answer_cache_for(user_message, use_cache)
+    if cache is None:
+        return await rag.arun(query=user_message, callbacks=callbacks)
+    version = await run_in_db_thread(get_dynamic_context)
+    cached, vector = await asyncio.to_thread(cache.lookup, user_message, version)
+    if cached is not None:
+        return cached
+    reply = await rag.arun(query=user_message, callbacks=callbacks)
+    await asyncio.to_thread(cache.add, user_message, reply, version, vector=vector)
+    return reply
+
+
+# Long-lived workers for stream_tokens(): an idle thread is reused for the next turn, so
+# its SQLite connection and dynamic context cache (both per thread) survive across turns.
+_stream_pool = None
+_stream_pool_lock = threading.Lock()
+
+
+def _get_stream_pool() -> ThreadPoolExecutor:
+    global _stream_pool
+    if _stream_pool is None:
+        with _stream_pool_lock:
+            if _stream_pool is None:
+                _stream_pool = ThreadPoolExecutor(thread_name_prefix="stream")
+    return _stream_pool
+
+
+def stream_tokens(run: Callable[[Callable[[str], None]], str]) -> Iterator[str]:
+    """Yield tokens from run(on_token) as they arrive; run's return value is yielded whole if nothing streamed.
+
+    run executes on a pooled worker thread; its exceptions are re-raised here.
+    """
+    tokens = queue.Queue()
+    done = object()
+    result = {}
+
+    def worker():
+        try:
+            result["reply"] = run(tokens.put)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            tokens.put(done)
+
+    _get_stream_pool().submit(worker)
+    streamed = False
+    while True:
+        token = tokens.get()
+        if token is done:
+            break
+        streamed = True
+        yield token
+    if "error" in result:
+        raise result["error"]
+    if not streamed and result.get("reply"):
+        yield result["reply"]
+
+
+def stream_reply(rag, user_message: str, use_cache: bool = True) -> Iterator[str]:
+    """get_reply() as a token stream."""
+    return stream_tokens(lambda on_token: get_reply(rag, user_message, on_token=on_token, use_cache=use_cache))
 
 
 RESERVATION_FIELDS = ["name", "surname", "car_number", "period_start", "period_end"]
 
 
+# How each message's reservation fields were obtained: "rules" (complete locally),
+# "skipped" (nothing to extract, no LLM call) or "llm" (fallback).
+extraction_stats = {"rules": 0, "skipped": 0, "llm": 0}
+_extraction_stats_lock = threading.Lock()
+
+
+def _count_extraction(kind: str) -> None:
+    with _extraction_stats_lock:
+        extraction_stats[kind] += 1
+
+
+def _extract_locally(text: str) -> tuple:
+    """(fields from the rules, whether the LLM should fill the rest or check the plate)."""
+    result = extract_reservation_rules(text)
+    if needs_llm_extraction(text, result, RESERVATION_FIELDS):
+        _count_extraction("llm")
+        return result, True
+    _count_extraction("rules" if all(result.get(f) for f in RESERVATION_FIELDS) else "skipped")
+    return result, False
+
+
 def extract_reservation_from_text(text: str) -> dict:
+    """Reservation fields from a message: rule-based first, the LLM only for plausible leftovers."""
+    result, use_llm = _extract_locally(text)
+    if not use_llm:
+        return result
+    return merge_llm_extraction(text, result, extract_reservation_with_llm(text))
+
+
+async def aextract_reservation_from_text(text: str) -> dict:
+    result, use_llm = _extract_locally(text)
+    if not use_llm:
+        return result
+    return merge_llm_extraction(text, result, await aextract_reservation_with_llm(text))
+
+
+def _extraction_prompt(text: str) -> str:
     prompt = PromptTemplate(
         input_variables=["text"],
         template="""From the following message, extract parking reservation details if present.
@@ -100,8 +278,10 @@ period_end: ... (date and time, e.g. 2025-02-22 17:00)
 Message:
 {text}""",
     )
-    llm = OpenAI(model=OPENAI_MODEL, temperature=0)
-    raw = llm.predict(prompt.format(text=text))
+    return prompt.format(text=text)
+
+
+def _parse_extraction(raw: str) -> dict:
     result = {}
     for line in raw.strip().split("\n"):
         if ":" in line:
@@ -113,31 +293,222 @@ Message:
     return result
 
 
+def extract_reservation_with_llm(text: str) -> dict:
+    return _parse_extraction(get_llm(OPENAI_MODEL, temperature=0).predict(_extraction_prompt(text)))
+
+
+async def aextract_reservation_with_llm(text: str) -> dict:
+    return _parse_extraction(await get_llm(OPENAI_MODEL, temperature=0).apredict(_extraction_prompt(text)))
+
+
 def try_submit_reservation(user_message: str) -> tuple:
-    extracted = extract_reservation_from_text(user_message)
+    return _submit_if_complete(extract_reservation_from_text(user_message))
+
+
+async def atry_submit_reservation(user_message: str) -> tuple:
+    return await run_in_db_thread(_submit_if_complete, await aextract_reservation_from_text(user_message))
+
+
+def _submit_if_complete(extracted: dict) -> tuple:
     if not all(extracted.get(f) for f in RESERVATION_FIELDS):
         return False, None
+    return submit_extracted_reservation(extracted)
+
+
+def submit_extracted_reservation(extracted: dict) -> tuple:
+    """Store a complete extraction as a pending request (or point to the existing one); (True, reply)."""
     try:
+        existing = find_open_reservation_request(
+            extracted["car_number"], extracted["period_start"], extracted["period_end"]
+        )
+        if existing:
+            return True, (
+                f"You already have a {existing['status']} reservation request for this car and period; "
+                f"its ID is {existing['id']}. You can ask: 'What is the status of my reservation {existing['id']}?'"
+            )
+        free = find_free_spaces(extracted["period_start"], extracted["period_end"])
         request_id = create_reservation_request(
             name=extracted["name"],
             surname=extracted["surname"],
             car_number=extracted["car_number"],
             period_start=extracted["period_start"],
             period_end=extracted["period_end"],
+            free_spaces=None if free is None else len(free),
         )
-        return True, (
+        reply = (
             f"Your reservation request has been sent to the administrator. "
             f"Your request ID is {request_id}. You can ask later: 'What is the status of my reservation {request_id}?'"
         )
+        if free is None and period_epochs(extracted["period_start"], extracted["period_end"])[0] is None:
+            reply += " Note: we could not read the reservation period as dates and times; the administrator will check it."
+        elif free is None:
+            reply += " Note: availability for this period is not published yet; the administrator will check it."
+        elif not free:
+            reply += " Note: no parking space is currently free for the whole period, so the request may be refused."
+        return True, reply
     except Exception as e:
         return True, f"Sorry, the request could not be submitted: {e}"
 
 
+# Speculative turns (SPECULATIVE_RAG_ENABLED): "launched" RAG answers started next to an
+# LLM extraction, "used" when no reservation came of it, "discarded" when one was submitted.
+speculation_stats = {"launched": 0, "used": 0, "discarded": 0}
+_speculation_stats_lock = threading.Lock()
+_speculation_pool = None
+_speculation_pool_lock = threading.Lock()
+
+
+def _count_speculation(kind: str) -> None:
+    with _speculation_stats_lock:
+        speculation_stats[kind] += 1
+
+
+def _get_speculation_pool() -> ThreadPoolExecutor:
+    global _speculation_pool
+    if _speculation_pool is None:
+        with _speculation_pool_lock:
+            if _speculation_pool is None:
+                _speculation_pool = ThreadPoolExecutor(thread_name_prefix="speculative-rag")
+    return _speculation_pool
+
+
+class _TokenGate:
+    """Holds back a speculative answer's tokens until the answer is kept (open) or dropped (close)."""
+
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+        self.buffer = []
+        self.state = "held"
+        self.lock = threading.Lock()
+
+    def push(self, token: str) -> None:
+        with self.lock:
+            if self.state == "held":
+                self.buffer.append(token)
+                return
+            if self.state == "closed":
+                return
+        self.on_token(token)
+
+    def open(self) -> None:
+        with self.lock:
+            held, self.buffer, self.state = self.buffer, [], "open"
+            # Flushed under the lock so later tokens cannot overtake the buffered ones.
+            for token in held:
+                self.on_token(token)
+
+    def close(self) -> None:
+        with self.lock:
+            self.buffer, self.state = [], "closed"
+
+
+def submit_or_answer(rag, user_message: str, on_token: Callable[[str], None] = None,
+                     speculative: bool = SPECULATIVE_RAG_ENABLED) -> str:
+    """Submit the reservation in the message if there is one, otherwise the RAG answer.
+
+    When the extraction needs the LLM and speculative is on, the RAG answer is generated at the
+    same time and thrown away if a reservation is submitted: one LLM round trip instead of two
+    for questions, one wasted RAG call for reservations. Its tokens reach on_token only once kept.
+    """
+    extracted, use_llm = _extract_locally(user_message)
+    if not (use_llm and speculative):
+        if use_llm:
+            extracted = merge_llm_extraction(user_message, extracted, extract_reservation_with_llm(user_message))
+        submitted, reply = _submit_if_complete(extracted)
+        return reply if submitted else get_reply(rag, user_message, on_token=on_token, use_cache=False)
+
+    gate = _TokenGate(on_token) if on_token else None
+    answer = _get_speculation_pool().submit(get_reply, rag, user_message, on_token=gate.push if gate else None,
+                                            use_cache=False)
+    _count_speculation("launched")
+    try:
+        extracted = merge_llm_extraction(user_message, extracted, extract_reservation_with_llm(user_message))
+        submitted, reply = _submit_if_complete(extracted)
+    except BaseException:
+        answer.cancel()
+        raise
+    if submitted:
+        # A running thread cannot be stopped; its answer is simply never used.
+        answer.cancel()
+        if gate:
+            gate.close()
+        _count_speculation("discarded")
+        return reply
+    if gate:
+        gate.open()
+    _count_speculation("used")
+    return answer.result()
+
+
+async def asubmit_or_answer(rag, user_message: str, on_token: Callable[[str], None] = None,
+                            speculative: bool = SPECULATIVE_RAG_ENABLED) -> str:
+    """submit_or_answer() on the event loop; a discarded RAG answer is cancelled mid-request."""
+    extracted, use_llm = _extract_locally(user_message)
+    if not (use_llm and speculative):
+        if use_llm:
+            extracted = merge_llm_extraction(user_message, extracted, await aextract_reservation_with_llm(user_message))
+        submitted, reply = await run_in_db_thread(_submit_if_complete, extracted)
+        return reply if submitted else await aget_reply(rag, user_message, on_token=on_token, use_cache=False)
+
+    gate = _TokenGate(on_token) if on_token else None
+    answer = asyncio.ensure_future(aget_reply(rag, user_message, on_token=gate.push if gate else None,
+                                              use_cache=False))
+    _count_speculation("launched")
+    try:
+        extracted = merge_llm_extraction(user_message, extracted, await aextract_reservation_with_llm(user_message))
+        submitted, reply = await run_in_db_thread(_submit_if_complete, extracted)
+    except BaseException:
+        answer.cancel()
+        raise
+    if submitted:
+        answer.cancel()
+        if gate:
+            gate.close()
+        _count_speculation("discarded")
+        return reply
+    if gate:
+        gate.open()
+    _count_speculation("used")
+    return await answer
+
+
+STATUS_WORDS = re.compile(r"\b(status|approved|refused|pending)\b", re.I)
+
+
+def _describe_request(info: dict, rid: int) -> str:
+    s = info["status"]
+    if s == "pending":
+        return f"Request {rid} is still pending administrator approval."
+    if s == "approved":
+        space = f" Your space: {info['space_id']}." if info.get("space_id") else ""
+        return f"Request {rid} has been approved. Period: {info.get('period_start', '')} to {info.get('period_end', '')}.{space}"
+    return f"Request {rid} was refused." + (f" Comment: {info['admin_comment']}" if info.get("admin_comment") else "")
+
+
+def answer_status_by_car(user_message: str) -> Optional[str]:
+    """Status question naming a registration number instead of a request ID; answered from the DB only."""
+    if not STATUS_WORDS.search(user_message):
+        return None
+    plate = find_plate(user_message)
+    if not plate:
+        return None
+    rows = get_reservations_by_car(plate, limit=3)
+    if not rows:
+        return f"There is no reservation request for car {plate}."
+    lines = []
+    for r in rows:
+        line = _describe_request(r, r["id"])
+        if r["status"] != "approved":
+            line += f" Period: {r['period_start']} to {r['period_end']}."
+        lines.append(f"- {line}")
+    return f"Reservation requests for car {plate}:\n" + "\n".join(lines)
+
+
 def answer_reservation_status(user_message: str) -> Optional[str]:
     match = re.search(r"(?:status|request)\s*(?:of|#|:)?\s*(\d+)|reservation\s*(\d+)|id\s*(\d+)", user_message, re.I)
     request_id_str = (match.group(1) or match.group(2) or match.group(3)) if match else None
     if not request_id_str:
-        return None
+        return answer_status_by_car(user_message)
     try:
         rid = int(request_id_str)
     except ValueError:
@@ -145,9 +516,9 @@ def answer_reservation_status(user_message: str) -> Optional[str]:
     info = get_reservation_status(rid)
     if not info:
         return f"There is no reservation request with ID {rid}."
-    s = info["status"]
-    if s == "pending":
-        return f"Request {rid} is still pending administrator approval."
-    if s == "approved":
-        return f"Request {rid} has been approved. Period: {info.get('period_start', '')} to {info.get('period_end', '')}."
-    return f"Request {rid} was refused." + (f" Comment: {info['admin_comment']}" if info.get("admin_comment") else "")
+    return _describe_request(info, rid)
+
+
+async def aanswer_reservation_status(user_message: str) -> Optional[str]:
+    """answer_reservation_status() on the DB thread pool."""
+    return await run_in_db_thread(answer_reservation_status, user_message)
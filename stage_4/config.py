@@ -17,6 +17,24 @@ ACTIVELOOP_DATASET_PATH = os.getenv(
 ACTIVELOOP_TOKEN = os.getenv("ACTIVELOOP_TOKEN", "")
 
 SQLITE_PATH = os.getenv("SQLITE_PATH", str(DATA_DIR / "parking.db"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+# Worker threads (each with its own connection) that run DB work for the async path.
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "4"))
+
+# Availability seeding: number of spaces (Central Garage has 450) and days ahead.
+PARKING_SPACES = int(os.getenv("PARKING_SPACES", "450"))
+AVAILABILITY_HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "7"))
+# Rolling-horizon maintenance: max rows deleted per transaction when pruning past days.
+AVAILABILITY_PRUNE_BATCH = int(os.getenv("AVAILABILITY_PRUNE_BATCH", "5000"))
+# Decided reservation requests older than this move to reservation_history.
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "1000"))
+# "rows": one availability row per space/hour; "bitmask": one 24-bit mask per space/day.
+AVAILABILITY_LAYOUT = os.getenv("AVAILABILITY_LAYOUT", "rows")
+# Prices and working hours are cached in-process for this long (seconds); writes bust it sooner.
+STATIC_CACHE_TTL_SECONDS = float(os.getenv("STATIC_CACHE_TTL_SECONDS", "300"))
 
 CONFIRMED_RESERVATIONS_FILE = os.getenv(
     "CONFIRMED_RESERVATIONS_FILE",
@@ -28,6 +46,22 @@ RESERVATION_SERVER_API_KEY = os.getenv("RESERVATION_SERVER_API_KEY", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+# Keep-alive connections kept open to the OpenAI API (shared by every thread).
+LLM_HTTP_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "10"))
+# Exact-match completion cache (llm_cache.py); 0 entries disables it.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(DATA_DIR / "llm_cache.db"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Semantic answer cache (answer_cache.py): cached questions kept (0 disables) and the
+# cosine similarity a new question needs to reuse an answer.
+ANSWER_CACHE_CAPACITY = int(os.getenv("ANSWER_CACHE_CAPACITY", "500"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# Local intent router (intent_router.py): below this confidence a message takes the full
+# status -> extraction -> RAG path; INTENT_ROUTER_ENABLED=0 always does.
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") != "0"
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.6"))
+# Full path only: when reservation extraction needs the LLM, start the RAG answer alongside it
+# and drop it if a reservation is submitted (lower latency, an extra LLM call per reservation).
+SPECULATIVE_RAG_ENABLED = os.getenv("SPECULATIVE_RAG_ENABLED", "1") != "0"
 
 RESERVATION_SERVER_HOST = os.getenv("RESERVATION_SERVER_HOST", "127.0.0.1")
 RESERVATION_SERVER_PORT = int(os.getenv("RESERVATION_SERVER_PORT", "8000"))
@@ -33,3 +33,120 @@ def get_dynamic_fixture():
             {"type": "ev", "first_hour": 6.00, "next_hours": 3.00, "day_max": 30.00},
         ],
     }
+
+
+def get_space_types(spaces: int = 450):
+    """Space type per space_id, following the numbering in STATIC_DOCS (150 spaces per level)."""
+    result = []
+    for space_id in range(1, spaces + 1):
+        offset = (space_id - 1) % 150
+        if offset < 5:
+            space_type = "disabled"
+        elif space_id <= 15:
+            space_type = "ev"
+        elif offset >= 130:
+            space_type = "wide"
+        else:
+            space_type = "standard"
+        result.append({"space_id": space_id, "type": space_type})
+    return result
+
+
+# Labeled user messages for the local intent router (intent_router.py):
+# status / submit / faq / chit_chat. INTENT_EVAL_CASES is held out for run_evaluate.py.
+INTENT_EXAMPLES = [
+    ("What is the status of my reservation 12?", "status"),
+    ("status of request 7", "status"),
+    ("Has request 31 been approved?", "status"),
+    ("Is my reservation 5 approved yet?", "status"),
+    ("Was my booking refused?", "status"),
+    ("Any news on reservation 44?", "status"),
+    ("Check the status for car AB-123-CD", "status"),
+    ("What's the status for car BG 1234 AB?", "status"),
+    ("Is my request still pending?", "status"),
+    ("Did the administrator approve my request?", "status"),
+    ("id 18 status please", "status"),
+    ("Was request #9 accepted?", "status"),
+    ("I submitted a request yesterday, is it confirmed?", "status"),
+    ("Has my booking for NS-045-KL gone through?", "status"),
+    ("Can you check reservation 102 for me?", "status"),
+    ("Why was my reservation refused?", "status"),
+    ("My name is John Smith, car AB-123-CD, from 2025-02-22 09:00 to 2025-02-22 17:00", "submit"),
+    ("I'd like to book a space tomorrow from 9am to 5pm, I'm Ana Petrović, car BG 1234 AB", "submit"),
+    ("Name: Marko, surname: Jovanović, plate NS-045-KL, 22.02.2025 08:00 - 24.02.2025 18:30", "submit"),
+    ("Please reserve a spot for Lena Novak, ZG 555 AA, February 25th 10:00 to 14:30", "submit"),
+    ("Book Monday 7:30 to 19:00 for Ivan Horvat, car M-AB 123", "submit"),
+    ("I want to make a reservation", "submit"),
+    ("I'd like to reserve a parking space", "submit"),
+    ("Can I book a spot for Saturday?", "submit"),
+    ("Reserve a space for me tomorrow morning", "submit"),
+    ("My car is KG 777 XY and I need a space on 1 March", "submit"),
+    ("I need parking from Friday 18:00 to Sunday 20:00", "submit"),
+    ("my name is john and I want to book", "submit"),
+    ("Reservation for Petra Kovač, NI 321 BC, 2025-02-27T08:00 to 2025-02-27T12:00", "submit"),
+    ("Book me in for next Tuesday 8am to 6pm please", "submit"),
+    ("I want to park here from 10:00 to 15:00 today, car LJ 12-ABC", "submit"),
+    ("Sign me up for a space this weekend", "submit"),
+    ("Where is the parking located?", "faq"),
+    ("What are your working hours?", "faq"),
+    ("When are you open?", "faq"),
+    ("How much does parking cost?", "faq"),
+    ("How much is it per hour?", "faq"),
+    ("What are your prices?", "faq"),
+    ("How do I book a space?", "faq"),
+    ("How do reservations work?", "faq"),
+    ("Do you have EV charging?", "faq"),
+    ("Are there spaces for disabled drivers?", "faq"),
+    ("What is the cancellation policy?", "faq"),
+    ("Can I pay by card?", "faq"),
+    ("Is the garage open on Sunday?", "faq"),
+    ("How many spaces are free today?", "faq"),
+    ("What is the address?", "faq"),
+    ("Is there a height limit for vans?", "faq"),
+    ("Do you have wide spaces for SUVs?", "faq"),
+    ("What happens if I don't show up?", "faq"),
+    ("How much is parking for a whole day?", "faq"),
+    ("Which level are the EV chargers on?", "faq"),
+    ("Is the parking guarded at night?", "faq"),
+    ("How do I cancel a reservation?", "faq"),
+    ("Is there a fee if I cancel late?", "faq"),
+    ("Hi", "chit_chat"),
+    ("Hello there!", "chit_chat"),
+    ("Good morning", "chit_chat"),
+    ("Thanks!", "chit_chat"),
+    ("Thank you very much", "chit_chat"),
+    ("Bye", "chit_chat"),
+    ("Goodbye, have a nice day", "chit_chat"),
+    ("ok", "chit_chat"),
+    ("Great, thanks", "chit_chat"),
+    ("How are you?", "chit_chat"),
+    ("Who are you?", "chit_chat"),
+    ("Cool", "chit_chat"),
+    ("See you", "chit_chat"),
+    ("hey", "chit_chat"),
+    ("You're very helpful", "chit_chat"),
+    ("That's all, thanks", "chit_chat"),
+]
+
+INTENT_EVAL_CASES = [
+    ("What's the status of reservation 23?", "status"),
+    ("Has request 8 been refused?", "status"),
+    ("Is booking 61 approved?", "status"),
+    ("status for car ZG 555 AA", "status"),
+    ("Did my request get approved?", "status"),
+    ("My name is Tom Jones, car LJ 12-ABC, 2025-03-01 22:00 to 2025-03-02 06:00", "submit"),
+    ("I want to reserve a space for Friday 9am to 1pm, car BG 777 CD, I'm Mila Ilić", "submit"),
+    ("Could I book a parking spot for tomorrow?", "submit"),
+    ("Reserve for Sara Kos, plate NS 44 AB, 3 March 08:00-12:00", "submit"),
+    ("I need a space next Wednesday afternoon", "submit"),
+    ("Where are you located?", "faq"),
+    ("What time do you close on Saturday?", "faq"),
+    ("How much for two hours?", "faq"),
+    ("Do you accept cash?", "faq"),
+    ("Can I cancel my booking for free?", "faq"),
+    ("Do you have chargers for electric cars?", "faq"),
+    ("Hello!", "chit_chat"),
+    ("thanks a lot", "chit_chat"),
+    ("bye bye", "chit_chat"),
+    ("good evening", "chit_chat"),
+]
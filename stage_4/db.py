@@ -1,182 +1,1411 @@
 """SQLite: dynamic parking data + reservation requests (Stage 4)."""
+import asyncio
+import calendar
+import json
+import os
+import re
 import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from datetime import date, timedelta, datetime
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-from config import SQLITE_PATH, DATA_DIR
-from data_gen import get_dynamic_fixture
+from config import (
+    SQLITE_PATH,
+    DATA_DIR,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    PARKING_SPACES,
+    AVAILABILITY_HORIZON_DAYS,
+    AVAILABILITY_LAYOUT,
+    AVAILABILITY_PRUNE_BATCH,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH,
+    STATIC_CACHE_TTL_SECONDS,
+    DB_THREAD_POOL_SIZE,
+)
+from data_gen import get_dynamic_fixture, get_space_types
+
+AVAILABILITY_LAYOUTS = ("rows", "bitmask")
+FULL_DAY_MASK = (1 << 24) - 1
+
+# One connection per thread (sqlite3 connections must not be shared across threads
+# without extra locking); reused by every db_session() on that thread.
+_local = threading.local()
 
 
 def _ensure_data_dir():
     Path(SQLITE_PATH).parent.mkdir(parents=True, exist_ok=True)
 
 
-def get_connection():
+def _configure_connection(conn: sqlite3.Connection) -> None:
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def open_connection() -> sqlite3.Connection:
+    """Open a new, tuned connection (WAL, synchronous=NORMAL, larger cache, mmap)."""
     _ensure_data_dir()
-    return sqlite3.connect(SQLITE_PATH)
+    conn = sqlite3.connect(SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    _configure_connection(conn)
+    return conn
+
+
+# Databases (by path) this process has already migrated; see get_connection().
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection, opening it on first use.
+
+    The first connection a process opens to a database applies any pending migrations,
+    so every entry point (chatbot, server, admin console) runs on the current schema.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = open_connection()
+        _local.conn = conn
+        _local.depth = 0
+        if SQLITE_PATH not in _migrated_paths:
+            with _migrate_lock:
+                if SQLITE_PATH not in _migrated_paths:
+                    migrate(conn)
+                    _migrated_paths.add(SQLITE_PATH)
+    return conn
+
+
+def close_connection() -> None:
+    """Close this thread's connection (e.g. on worker shutdown); the next session reopens it."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.depth = 0
+
+
+# Async callers run DB work on this small pool; each worker thread keeps its own
+# connection (see _local), so the event loop never blocks on SQLite.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="db")
+    return _executor
+
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) run on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), partial(fn, *args, **kwargs))
 
 
 @contextmanager
-def db_session():
+def db_session(immediate: bool = False):
+    """Transaction on the thread's shared connection. Nested sessions join the outer one.
+
+    immediate=True starts with BEGIN IMMEDIATE, taking the write lock before the first
+    read so a check-then-write sequence cannot interleave with another writer.
+    """
     conn = get_connection()
-    conn.row_factory = sqlite3.Row
+    _local.depth += 1
     try:
+        if immediate and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
         yield conn
-        conn.commit()
+        if _local.depth == 1:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if _local.depth == 1:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        _local.depth -= 1
+
+
+def _migration_1_base_schema(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS working_hours (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day TEXT NOT NULL,
+            open_time TEXT NOT NULL,
+            close_time TEXT NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            space_type TEXT NOT NULL,
+            first_hour REAL NOT NULL,
+            next_hours REAL NOT NULL,
+            day_max REAL NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS availability (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            space_id INTEGER NOT NULL,
+            slot_date TEXT NOT NULL,
+            hour_slot INTEGER NOT NULL,
+            available INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS reservation_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            surname TEXT NOT NULL,
+            car_number TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            period_end TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            admin_comment TEXT,
+            created_at TEXT NOT NULL,
+            decided_at TEXT
+        )
+    """)
+
+
+def _migration_2_indexes(c):
+    # Covers both availability counts (slot_date filter, SUM/COUNT over available).
+    c.execute("CREATE INDEX IF NOT EXISTS idx_availability_date ON availability (slot_date, available)")
+    # Pending queue: filter on status, already ordered by created_at (id rides along as rowid).
+    c.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_created ON reservation_requests (status, created_at)")
+    c.execute("ANALYZE")
+
+
+def _migration_3_availability_bitmask(c):
+    # Bit h of free_mask is set when the space is free during hour h (0-23).
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS availability_days (
+            slot_date TEXT NOT NULL,
+            space_id INTEGER NOT NULL,
+            free_mask INTEGER NOT NULL,
+            PRIMARY KEY (slot_date, space_id)
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+def _seed_parking_spaces(c, spaces: int) -> None:
+    c.executemany(
+        "INSERT OR IGNORE INTO parking_spaces (space_id, space_type) VALUES (?, ?)",
+        [(row["space_id"], row["type"]) for row in get_space_types(spaces)],
+    )
+
+
+def _migration_4_free_space_search(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS parking_spaces (
+            space_id INTEGER PRIMARY KEY,
+            space_type TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_parking_spaces_type ON parking_spaces (space_type)")
+    existing = c.execute(
+        "SELECT MAX(m) FROM (SELECT MAX(space_id) AS m FROM availability UNION ALL SELECT MAX(space_id) FROM availability_days)"
+    ).fetchone()[0]
+    _seed_parking_spaces(c, max(PARKING_SPACES, existing or 0))
+    # Replaces idx_availability_date: same prefix for the day counts, and also covers
+    # multi-day free-slot scans (slot_date range, hour_slot bounds, space_id grouping).
+    c.execute("DROP INDEX IF EXISTS idx_availability_date")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_availability_slots ON availability (slot_date, available, hour_slot, space_id)"
+    )
+    # Free spaces for the period at submission time; NULL when the period could not be parsed.
+    c.execute("ALTER TABLE reservation_requests ADD COLUMN free_spaces INTEGER")
+    c.execute("ANALYZE")
+
+
+def _migration_5_assigned_space(c):
+    # Space whose slots were claimed when the request was approved.
+    c.execute("ALTER TABLE reservation_requests ADD COLUMN space_id INTEGER")
+
+
+_HOURS_VALUES = "(VALUES " + ", ".join(f"({h})" for h in range(24)) + ")"
+
+# availability_counts mirrors SUM(available)/COUNT(*) per (slot_date, hour_slot); these
+# triggers keep it current for whichever availability layout is in use.
+_AVAILABILITY_COUNT_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_availability_counts_insert AFTER INSERT ON availability
+       BEGIN
+           INSERT INTO availability_counts (slot_date, hour_slot, free, total)
+           VALUES (NEW.slot_date, NEW.hour_slot, NEW.available != 0, 1)
+           ON CONFLICT (slot_date, hour_slot) DO UPDATE SET free = free + excluded.free, total = total + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_availability_counts_delete AFTER DELETE ON availability
+       BEGIN
+           UPDATE availability_counts SET free = free - (OLD.available != 0), total = total - 1
+           WHERE slot_date = OLD.slot_date AND hour_slot = OLD.hour_slot;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_availability_counts_update
+       AFTER UPDATE OF available, slot_date, hour_slot ON availability
+       WHEN OLD.available IS NOT NEW.available OR OLD.slot_date IS NOT NEW.slot_date
+            OR OLD.hour_slot IS NOT NEW.hour_slot
+       BEGIN
+           UPDATE availability_counts SET free = free - (OLD.available != 0), total = total - 1
+           WHERE slot_date = OLD.slot_date AND hour_slot = OLD.hour_slot;
+           INSERT INTO availability_counts (slot_date, hour_slot, free, total)
+           VALUES (NEW.slot_date, NEW.hour_slot, NEW.available != 0, 1)
+           ON CONFLICT (slot_date, hour_slot) DO UPDATE SET free = free + excluded.free, total = total + 1;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_availability_days_counts_insert AFTER INSERT ON availability_days
+       BEGIN
+           INSERT INTO availability_counts (slot_date, hour_slot, free, total)
+           SELECT NEW.slot_date, column1, 0, 0 FROM {_HOURS_VALUES} WHERE true
+           ON CONFLICT (slot_date, hour_slot) DO NOTHING;
+           UPDATE availability_counts SET free = free + ((NEW.free_mask >> hour_slot) & 1), total = total + 1
+           WHERE slot_date = NEW.slot_date;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_availability_days_counts_delete AFTER DELETE ON availability_days
+       BEGIN
+           UPDATE availability_counts SET free = free - ((OLD.free_mask >> hour_slot) & 1), total = total - 1
+           WHERE slot_date = OLD.slot_date;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_availability_days_counts_update
+       AFTER UPDATE OF free_mask, slot_date ON availability_days
+       WHEN OLD.free_mask IS NOT NEW.free_mask OR OLD.slot_date IS NOT NEW.slot_date
+       BEGIN
+           UPDATE availability_counts SET free = free - ((OLD.free_mask >> hour_slot) & 1), total = total - 1
+           WHERE slot_date = OLD.slot_date;
+           INSERT INTO availability_counts (slot_date, hour_slot, free, total)
+           SELECT NEW.slot_date, column1, 0, 0 FROM {_HOURS_VALUES} WHERE true
+           ON CONFLICT (slot_date, hour_slot) DO NOTHING;
+           UPDATE availability_counts SET free = free + ((NEW.free_mask >> hour_slot) & 1), total = total + 1
+           WHERE slot_date = NEW.slot_date;
+       END""",
+]
+
+# Expected availability_counts contents, computed from the base tables (both layouts).
+_AVAILABILITY_COUNTS_SOURCE = """
+    SELECT slot_date, hour_slot, SUM(free), SUM(total) FROM (
+        SELECT slot_date, hour_slot, available != 0 AS free, 1 AS total FROM availability
+        UNION ALL
+        SELECT slot_date, column1, (free_mask >> column1) & 1, 1 FROM availability_days, """ + _HOURS_VALUES + """
+    ) GROUP BY slot_date, hour_slot"""
+
+
+def _rebuild_availability_counts(c) -> None:
+    c.execute("DELETE FROM availability_counts")
+    c.execute(
+        "INSERT INTO availability_counts (slot_date, hour_slot, free, total) " + _AVAILABILITY_COUNTS_SOURCE
+    )
+
+
+def _migration_6_availability_counts(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS availability_counts (
+            slot_date TEXT NOT NULL,
+            hour_slot INTEGER NOT NULL,
+            free INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (slot_date, hour_slot)
+        ) WITHOUT ROWID
+    """)
+    for trigger in _AVAILABILITY_COUNT_TRIGGERS:
+        c.execute(trigger)
+    _rebuild_availability_counts(c)
+
+
+def _migration_7_availability_history(c):
+    # Per-hour free/total counts of past days, kept after their availability rows are pruned.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS availability_history (
+            slot_date TEXT NOT NULL,
+            hour_slot INTEGER NOT NULL,
+            free INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (slot_date, hour_slot)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_8_slot_order_index(c):
+    # Day counts now come from availability_counts, so the index can lead with
+    # (slot_date, hour_slot): period bounds become one index range instead of whole days.
+    c.execute("DROP INDEX IF EXISTS idx_availability_slots")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_availability_period ON availability (slot_date, hour_slot, available, space_id)"
+    )
+    c.execute("ANALYZE")
+
+
+def _migration_9_period_rtree(c):
+    # Periods as epoch seconds (wall-clock times encoded as UTC); NULL when unparseable.
+    c.execute("ALTER TABLE reservation_requests ADD COLUMN period_start_ts INTEGER")
+    c.execute("ALTER TABLE reservation_requests ADD COLUMN period_end_ts INTEGER")
+    c.execute("ALTER TABLE reservation_requests ADD COLUMN car_key INTEGER")
+    rows = c.execute("SELECT id, car_number, period_start, period_end FROM reservation_requests").fetchall()
+    c.executemany(
+        "UPDATE reservation_requests SET period_start_ts = ?, period_end_ts = ?, car_key = ? WHERE id = ?",
+        [(*period_epochs(r[2], r[3]), car_key(r[1]), r[0]) for r in rows],
+    )
+    # 2-D R*Tree keyed by request id: time in minutes [start, end] x car_key [key, key].
+    # Integer coordinates (rtree_i32) keep minute bounds exact; results are re-checked
+    # against the exact epoch columns.
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS reservation_periods USING rtree_i32(
+            id, start_min, end_min, car_min, car_max
+        )
+    """)
+    for trigger in _RESERVATION_PERIOD_TRIGGERS:
+        c.execute(trigger)
+    c.execute(
+        """INSERT INTO reservation_periods (id, start_min, end_min, car_min, car_max)
+           SELECT id, period_start_ts / 60, (period_end_ts + 59) / 60, car_key, car_key
+           FROM reservation_requests WHERE period_start_ts IS NOT NULL AND period_end_ts IS NOT NULL"""
+    )
+
+
+_RESERVATION_PERIOD_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_reservation_periods_insert AFTER INSERT ON reservation_requests
+       WHEN NEW.period_start_ts IS NOT NULL AND NEW.period_end_ts IS NOT NULL
+       BEGIN
+           INSERT INTO reservation_periods (id, start_min, end_min, car_min, car_max)
+           VALUES (NEW.id, NEW.period_start_ts / 60, (NEW.period_end_ts + 59) / 60, NEW.car_key, NEW.car_key);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_reservation_periods_update
+       AFTER UPDATE OF period_start_ts, period_end_ts, car_key ON reservation_requests
+       BEGIN
+           DELETE FROM reservation_periods WHERE id = OLD.id;
+           INSERT INTO reservation_periods (id, start_min, end_min, car_min, car_max)
+           SELECT NEW.id, NEW.period_start_ts / 60, (NEW.period_end_ts + 59) / 60, NEW.car_key, NEW.car_key
+           WHERE NEW.period_start_ts IS NOT NULL AND NEW.period_end_ts IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_reservation_periods_delete AFTER DELETE ON reservation_requests
+       BEGIN
+           DELETE FROM reservation_periods WHERE id = OLD.id;
+       END""",
+]
+
+
+_HISTORY_COLUMNS = (
+    "id, name, surname, car_number, period_start, period_end, status, admin_comment, created_at, decided_at, space_id, "
+    "car_key"
+)
+
+
+def _migration_10_reservation_history(c):
+    # Cold storage for decided requests: same IDs, only the columns lookups need.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS reservation_history (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            surname TEXT NOT NULL,
+            car_number TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            period_end TEXT NOT NULL,
+            status TEXT NOT NULL,
+            admin_comment TEXT,
+            created_at TEXT NOT NULL,
+            decided_at TEXT,
+            space_id INTEGER
+        )
+    """)
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_requests_decided ON reservation_requests (decided_at) WHERE status <> 'pending'"
+    )
 
 
-def init_db():
+def _migration_11_request_dedup(c):
+    # One live (pending or approved) request per car and period; refused ones may be resubmitted.
+    c.execute("ALTER TABLE reservation_requests ADD COLUMN dedup_key TEXT")
+    rows = c.execute(
+        "SELECT id, car_number, period_start, period_end, status FROM reservation_requests ORDER BY id"
+    ).fetchall()
+    seen = set()
+    keys = []
+    for request_id, car_number, period_start, period_end, status in rows:
+        key = reservation_dedup_key(car_number, period_start, period_end)
+        if status != "refused":
+            if key in seen:
+                # Only the oldest live request gets the key; newer duplicates keep a NULL key.
+                continue
+            seen.add(key)
+        keys.append((key, request_id))
+    c.executemany("UPDATE reservation_requests SET dedup_key = ? WHERE id = ?", keys)
+    c.execute(
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_dedup ON reservation_requests (dedup_key)
+           WHERE status <> 'refused'"""
+    )
+
+
+def _migration_12_car_index(c):
+    # Status by registration number: equality on car_key, newest first via the rowid.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_requests_car ON reservation_requests (car_key)")
+
+
+def _migration_13_history_car_index(c):
+    # Status by registration number also finds archived requests.
+    c.execute("ALTER TABLE reservation_history ADD COLUMN car_key INTEGER")
+    rows = c.execute("SELECT id, car_number FROM reservation_history").fetchall()
+    c.executemany("UPDATE reservation_history SET car_key = ? WHERE id = ?", [(car_key(r[1]), r[0]) for r in rows])
+    c.execute("CREATE INDEX IF NOT EXISTS idx_history_car ON reservation_history (car_key)")
+
+
+# Append-only: (version, migration). Applied in order; PRAGMA user_version stores the last one.
+MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_indexes),
+    (3, _migration_3_availability_bitmask),
+    (4, _migration_4_free_space_search),
+    (5, _migration_5_assigned_space),
+    (6, _migration_6_availability_counts),
+    (7, _migration_7_availability_history),
+    (8, _migration_8_slot_order_index),
+    (9, _migration_9_period_rtree),
+    (10, _migration_10_reservation_history),
+    (11, _migration_11_request_dedup),
+    (12, _migration_12_car_index),
+    (13, _migration_13_history_car_index),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = SCHEMA_VERSION) -> list:
+    """Bring the schema up to `target` in place. Returns the versions applied.
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction, so concurrent
+    processes starting up together apply it once.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version > target:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def hour_range_mask(start_hour: int, end_hour: int) -> int:
+    """Mask with bits start_hour..end_hour-1 set (end_hour is exclusive, 0 <= start < end <= 24)."""
+    if not 0 <= start_hour < end_hour <= 24:
+        raise ValueError("hours must satisfy 0 <= start_hour < end_hour <= 24")
+    return ((1 << end_hour) - 1) ^ ((1 << start_hour) - 1)
+
+
+def get_availability_layout(conn: sqlite3.Connection) -> str:
+    row = conn.execute("SELECT value FROM settings WHERE key = 'availability_layout'").fetchone()
+    return row[0] if row else "rows"
+
+
+def _set_availability_layout(conn: sqlite3.Connection, layout: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO settings (key, value) VALUES ('availability_layout', ?)",
+        (layout,),
+    )
+
+
+def get_parking_space_count(conn: sqlite3.Connection) -> int:
+    """Spaces the garage was seeded with by init_db(); older databases fall back to the
+    highest space_id in availability, then to PARKING_SPACES."""
+    row = conn.execute("SELECT value FROM settings WHERE key = 'parking_spaces'").fetchone()
+    if row:
+        return int(row[0])
+    table = "availability_days" if get_availability_layout(conn) == "bitmask" else "availability"
+    return conn.execute(f"SELECT MAX(space_id) FROM {table}").fetchone()[0] or PARKING_SPACES
+
+
+def _set_parking_space_count(conn: sqlite3.Connection, spaces: int) -> None:
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('parking_spaces', ?)", (str(spaces),))
+
+
+def seed_availability(conn: sqlite3.Connection, spaces: int = PARKING_SPACES,
+                      days: int = AVAILABILITY_HORIZON_DAYS, start: date = None) -> dict:
+    """Insert free slots for every space/day in the database's availability layout.
+
+    Rows are generated inside SQLite by recursive CTEs (no per-row Python round trip),
+    in slot_date order so index pages are appended rather than split.
+    Returns {"rows", "seconds", "rows_per_second"}.
+    """
+    start = start or date.today()
+    params = {"days": days, "spaces": spaces, "start": start.isoformat(), "mask": FULL_DAY_MASK}
+    ctes = """WITH RECURSIVE
+               days(d, slot_date) AS (
+                   SELECT 0, date(:start)
+                   UNION ALL SELECT d + 1, date(:start, '+' || (d + 1) || ' days') FROM days WHERE d + 1 < :days
+               ),
+               hours(h) AS (SELECT 0 UNION ALL SELECT h + 1 FROM hours WHERE h < 23),
+               spaces(s) AS (SELECT 1 UNION ALL SELECT s + 1 FROM spaces WHERE s < :spaces)"""
+    t0 = time.perf_counter()
+    if get_availability_layout(conn) == "bitmask":
+        conn.execute(
+            ctes + """
+           INSERT OR IGNORE INTO availability_days (slot_date, space_id, free_mask)
+           SELECT slot_date, s, :mask FROM days, spaces
+           WHERE :days > 0 AND :spaces > 0
+           ORDER BY d, s""",
+            params,
+        )
+    else:
+        conn.execute(
+            ctes + """
+           INSERT INTO availability (space_id, slot_date, hour_slot, available)
+           SELECT s, slot_date, h, 1
+           FROM days, hours, spaces
+           WHERE :days > 0 AND :spaces > 0
+           ORDER BY d, h, s""",
+            params,
+        )
+    seconds = time.perf_counter() - t0
+    # cursor.rowcount is not reported for WITH ... INSERT on every Python version; changes()
+    # also leaves out rows written by the availability_counts triggers.
+    rows = conn.execute("SELECT changes()").fetchone()[0]
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0}
+
+
+def convert_availability_layout(layout: str) -> dict:
+    """Move all availability data to `layout` ("rows" or "bitmask") in one transaction.
+
+    A space-day in the bitmask layout always covers 24 hours; hours missing from the
+    rows layout become occupied bits, and come back as available = 0 rows.
+    """
+    if layout not in AVAILABILITY_LAYOUTS:
+        raise ValueError(f"layout must be one of {AVAILABILITY_LAYOUTS}")
     with db_session() as conn:
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS working_hours (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                day TEXT NOT NULL,
-                open_time TEXT NOT NULL,
-                close_time TEXT NOT NULL
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS prices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                space_type TEXT NOT NULL,
-                first_hour REAL NOT NULL,
-                next_hours REAL NOT NULL,
-                day_max REAL NOT NULL
+        current = get_availability_layout(conn)
+        if current == layout:
+            return {"layout": layout, "rows": 0}
+        if layout == "bitmask":
+            conn.execute(
+                """INSERT OR REPLACE INTO availability_days (slot_date, space_id, free_mask)
+                   SELECT slot_date, space_id, SUM(CASE WHEN available THEN 1 << hour_slot ELSE 0 END)
+                   FROM availability GROUP BY slot_date, space_id"""
             )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS availability (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                space_id INTEGER NOT NULL,
-                slot_date TEXT NOT NULL,
-                hour_slot INTEGER NOT NULL,
-                available INTEGER NOT NULL DEFAULT 1
+            written = conn.execute("SELECT changes()").fetchone()[0]
+            conn.execute("DELETE FROM availability")
+        else:
+            conn.execute(
+                """WITH RECURSIVE hours(h) AS (SELECT 0 UNION ALL SELECT h + 1 FROM hours WHERE h < 23)
+                   INSERT INTO availability (space_id, slot_date, hour_slot, available)
+                   SELECT space_id, slot_date, h, (free_mask >> h) & 1
+                   FROM availability_days, hours ORDER BY slot_date, h, space_id"""
             )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS reservation_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                surname TEXT NOT NULL,
-                car_number TEXT NOT NULL,
-                period_start TEXT NOT NULL,
-                period_end TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending',
-                admin_comment TEXT,
-                created_at TEXT NOT NULL,
-                decided_at TEXT
-            )
-        """)
+            written = conn.execute("SELECT changes()").fetchone()[0]
+            conn.execute("DELETE FROM availability_days")
+        _set_availability_layout(conn, layout)
+        return {"layout": layout, "rows": written}
+
 
+def init_db(spaces: int = PARKING_SPACES, days: int = AVAILABILITY_HORIZON_DAYS,
+            layout: str = AVAILABILITY_LAYOUT):
+    """Create/migrate the schema and seed a fresh database. Returns seed stats, or None if already seeded.
+
+    `layout` only applies to a fresh database; use convert_availability_layout() for an existing one.
+    """
+    if layout not in AVAILABILITY_LAYOUTS:
+        raise ValueError(f"layout must be one of {AVAILABILITY_LAYOUTS}")
+    migrate(get_connection())
+    with db_session() as conn:
+        c = conn.cursor()
         c.execute("SELECT COUNT(*) FROM working_hours")
-        if c.fetchone()[0] == 0:
-            fixture = get_dynamic_fixture()
-            for row in fixture["working_hours"]:
-                c.execute(
-                    "INSERT INTO working_hours (day, open_time, close_time) VALUES (?, ?, ?)",
-                    (row["day"], row["open"], row["close"]),
-                )
-            for row in fixture["prices"]:
-                c.execute(
-                    "INSERT INTO prices (space_type, first_hour, next_hours, day_max) VALUES (?, ?, ?, ?)",
-                    (row["type"], row["first_hour"], row["next_hours"], row["day_max"]),
+        if c.fetchone()[0] != 0:
+            return None
+        fixture = get_dynamic_fixture()
+        c.executemany(
+            "INSERT INTO working_hours (day, open_time, close_time) VALUES (?, ?, ?)",
+            [(row["day"], row["open"], row["close"]) for row in fixture["working_hours"]],
+        )
+        c.executemany(
+            "INSERT INTO prices (space_type, first_hour, next_hours, day_max) VALUES (?, ?, ?, ?)",
+            [(row["type"], row["first_hour"], row["next_hours"], row["day_max"]) for row in fixture["prices"]],
+        )
+        _set_availability_layout(conn, layout)
+        _set_parking_space_count(conn, spaces)
+        # Migration 4 fills parking_spaces up to PARKING_SPACES; a fresh garage has `spaces`.
+        c.execute("DELETE FROM parking_spaces WHERE space_id > ?", (spaces,))
+        _seed_parking_spaces(c, spaces)
+        stats = seed_availability(conn, spaces=spaces, days=days)
+    invalidate_static_cache()
+    return stats
+
+
+def maintain_availability_horizon(days: int = AVAILABILITY_HORIZON_DAYS, spaces: int = None,
+                                  today: date = None, archive: bool = True,
+                                  batch_size: int = AVAILABILITY_PRUNE_BATCH, pause_seconds: float = 0.0) -> dict:
+    """Keep availability covering [today, today + days): seed missing days, prune past ones.
+
+    Safe to call from a scheduler or at every startup; it is a no-op when the horizon is
+    current. Every write is a short transaction (one seeded day, or at most `batch_size`
+    deleted rows), so WAL readers are never blocked and writers wait only briefly.
+    With archive=True the per-hour counts of a pruned day are copied to
+    availability_history first. New days get `spaces` spaces, by default the count the
+    database was seeded with (get_parking_space_count()).
+    Returns counts of days/rows touched and the time taken.
+    """
+    today = today or date.today()
+    t0 = time.perf_counter()
+    report = {"days_added": 0, "rows_added": 0, "days_pruned": 0, "rows_deleted": 0, "batches": 0}
+
+    conn = get_connection()
+    spaces = spaces or get_parking_space_count(conn)
+    bitmask = get_availability_layout(conn) == "bitmask"
+    table, key, key_cols = (
+        ("availability_days", "(slot_date, space_id)", "slot_date, space_id") if bitmask
+        else ("availability", "id", "id")
+    )
+
+    for d in range(days):
+        slot_date = today + timedelta(days=d)
+        with db_session(immediate=True) as conn:
+            if conn.execute(f"SELECT 1 FROM {table} WHERE slot_date = ? LIMIT 1", (slot_date.isoformat(),)).fetchone():
+                continue
+            stats = seed_availability(conn, spaces=spaces, days=1, start=slot_date)
+        report["days_added"] += 1
+        report["rows_added"] += stats["rows"]
+        report["batches"] += 1
+
+    past = [r[0] for r in conn.execute(
+        "SELECT DISTINCT slot_date FROM availability_counts WHERE slot_date < ? ORDER BY slot_date",
+        (today.isoformat(),),
+    )]
+    for slot_date in past:
+        if archive:
+            with db_session() as conn:
+                conn.execute(
+                    """INSERT OR REPLACE INTO availability_history (slot_date, hour_slot, free, total)
+                       SELECT slot_date, hour_slot, free, total FROM availability_counts
+                       WHERE slot_date = ? AND total > 0""",
+                    (slot_date,),
                 )
-            today = date.today()
-            for space_id in range(1, 11):
-                for d in range(7):
-                    slot_date = (today + timedelta(days=d)).isoformat()
-                    for hour in range(24):
-                        c.execute(
-                            "INSERT INTO availability (space_id, slot_date, hour_slot, available) VALUES (?, ?, ?, ?)",
-                            (space_id, slot_date, hour, 1),
-                        )
+        while True:
+            with db_session() as conn:
+                deleted = conn.execute(
+                    f"DELETE FROM {table} WHERE {key} IN (SELECT {key_cols} FROM {table} WHERE slot_date = ? LIMIT ?)",
+                    (slot_date, batch_size),
+                ).rowcount
+            report["batches"] += 1
+            report["rows_deleted"] += deleted
+            if deleted < batch_size:
+                break
+            if pause_seconds:
+                time.sleep(pause_seconds)
+        with db_session() as conn:
+            conn.execute("DELETE FROM availability_counts WHERE slot_date = ? AND total = 0", (slot_date,))
+        report["days_pruned"] += 1
 
+    report["seconds"] = time.perf_counter() - t0
+    return report
 
-def get_working_hours():
+
+# Prices and working hours change rarely, so they are cached per process for
+# STATIC_CACHE_TTL_SECONDS. Writers touch a stamp file next to the database; every
+# process compares its mtime on read (one stat(), no query), so other workers drop
+# their copy on the next turn instead of waiting for the TTL.
+_static_cache = {}
+_static_cache_lock = threading.Lock()
+_static_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _static_stamp_path() -> str:
+    return SQLITE_PATH + ".static-stamp"
+
+
+def _static_stamp() -> int:
+    try:
+        return os.stat(_static_stamp_path()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def invalidate_static_cache(broadcast: bool = True) -> None:
+    """Drop cached prices/working hours; with broadcast, also tell other processes."""
+    with _static_cache_lock:
+        _static_cache.clear()
+    if broadcast:
+        _ensure_data_dir()
+        path = _static_stamp_path()
+        with open(path, "a"):
+            pass
+        # Bump explicitly: two writes inside the filesystem's mtime granularity must still differ.
+        mtime = max(time.time_ns(), _static_stamp() + 1)
+        os.utime(path, ns=(mtime, mtime))
+
+
+def get_static_cache_stats() -> dict:
+    with _static_cache_lock:
+        return {**_static_cache_stats, "entries": len(_static_cache)}
+
+
+def _cached_static(name: str, loader):
+    """Return loader() from the cache unless it expired or the stamp file changed."""
+    key = (SQLITE_PATH, name)
+    stamp = _static_stamp()
+    now = time.monotonic()
+    with _static_cache_lock:
+        entry = _static_cache.get(key)
+        if entry and entry[0] == stamp and entry[1] > now:
+            _static_cache_stats["hits"] += 1
+            return [dict(r) for r in entry[2]]
+        _static_cache_stats["misses"] += 1
+    rows = loader()
+    with _static_cache_lock:
+        _static_cache[key] = (stamp, now + STATIC_CACHE_TTL_SECONDS, rows)
+    return [dict(r) for r in rows]
+
+
+def _load_working_hours():
     with db_session() as conn:
         c = conn.cursor()
         c.execute("SELECT day, open_time, close_time FROM working_hours ORDER BY id")
         return [{"day": r[0], "open": r[1], "close": r[2]} for r in c.fetchall()]
 
 
-def get_prices():
+def _load_prices():
     with db_session() as conn:
         c = conn.cursor()
         c.execute("SELECT space_type, first_hour, next_hours, day_max FROM prices")
         return [{"type": r[0], "first_hour": r[1], "next_hours": r[2], "day_max": r[3]} for r in c.fetchall()]
 
 
-def get_availability_summary(date_str: str):
-    with db_session() as conn:
+def get_working_hours():
+    return _cached_static("working_hours", _load_working_hours)
+
+
+def get_prices():
+    return _cached_static("prices", _load_prices)
+
+
+def set_working_hours(hours: list) -> None:
+    """Replace working hours ([{"day", "open", "close"}, ...]) and bust every process's cache."""
+    with db_session(immediate=True) as conn:
         c = conn.cursor()
-        c.execute(
-            "SELECT COUNT(*) FROM availability WHERE slot_date = ? AND available = 1",
-            (date_str,),
+        c.execute("DELETE FROM working_hours")
+        c.executemany(
+            "INSERT INTO working_hours (day, open_time, close_time) VALUES (?, ?, ?)",
+            [(row["day"], row["open"], row["close"]) for row in hours],
+        )
+    invalidate_static_cache()
+
+
+def set_prices(prices: list) -> None:
+    """Replace prices ([{"type", "first_hour", "next_hours", "day_max"}, ...]) and bust every process's cache."""
+    with db_session(immediate=True) as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM prices")
+        c.executemany(
+            "INSERT INTO prices (space_type, first_hour, next_hours, day_max) VALUES (?, ?, ?, ?)",
+            [(row["type"], row["first_hour"], row["next_hours"], row["day_max"]) for row in prices],
         )
-        available = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM availability WHERE slot_date = ?", (date_str,))
-        total = c.fetchone()[0]
+    invalidate_static_cache()
+
+
+def _count_availability(conn: sqlite3.Connection, date_str: str) -> tuple:
+    """(available, total) hourly slots for one date: at most 24 rows of availability_counts."""
+    return conn.execute(
+        "SELECT COALESCE(SUM(free), 0), COALESCE(SUM(total), 0) FROM availability_counts WHERE slot_date = ?",
+        (date_str,),
+    ).fetchone()
+
+
+def get_availability_summary(date_str: str):
+    with db_session() as conn:
+        available, total = _count_availability(conn, date_str)
         return {"available": available, "total": total, "date": date_str}
 
 
-def create_reservation_request(name: str, surname: str, car_number: str, period_start: str, period_end: str) -> int:
+def get_hourly_availability(date_str: str) -> list:
+    """Per-hour free/total slots for one date, from availability_counts."""
+    with db_session() as conn:
+        rows = conn.execute(
+            "SELECT hour_slot, free, total FROM availability_counts WHERE slot_date = ? ORDER BY hour_slot",
+            (date_str,),
+        ).fetchall()
+        return [{"hour": r[0], "free": r[1], "total": r[2]} for r in rows]
+
+
+def check_availability_counts(repair: bool = False) -> dict:
+    """Compare availability_counts with the base tables; rebuild it if repair=True and it drifted.
+
+    Returns {"mismatched": <number of (slot_date, hour_slot) keys that differ>, "repaired": bool}.
+    """
+    with db_session(immediate=repair) as conn:
+        mismatched = conn.execute(
+            f"""WITH expected(slot_date, hour_slot, free, total) AS ({_AVAILABILITY_COUNTS_SOURCE}),
+                     actual AS (SELECT slot_date, hour_slot, free, total FROM availability_counts WHERE total > 0)
+                SELECT COUNT(*) FROM (
+                    SELECT slot_date, hour_slot FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+                    UNION
+                    SELECT slot_date, hour_slot FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)
+                )"""
+        ).fetchone()[0]
+        if mismatched and repair:
+            _rebuild_availability_counts(conn)
+        return {"mismatched": mismatched, "repaired": bool(mismatched and repair)}
+
+
+def get_spaces_free_between(date_str: str, start_hour: int, end_hour: int) -> list:
+    """Space IDs free for every hour in [start_hour, end_hour) on date_str, in either layout."""
+    mask = hour_range_mask(start_hour, end_hour)
+    with db_session() as conn:
+        if get_availability_layout(conn) == "bitmask":
+            rows = conn.execute(
+                "SELECT space_id FROM availability_days WHERE slot_date = ? AND (free_mask & ?) = ? ORDER BY space_id",
+                (date_str, mask, mask),
+            ).fetchall()
+        else:
+            hours = end_hour - start_hour
+            rows = conn.execute(
+                """SELECT space_id FROM availability
+                   WHERE slot_date = ? AND hour_slot >= ? AND hour_slot < ?
+                   GROUP BY space_id HAVING COUNT(*) = ? AND SUM(available) = ?
+                   ORDER BY space_id""",
+                (date_str, start_hour, end_hour, hours, hours),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+_PERIOD_FORMATS = ("%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M", "%d/%m/%Y %H:%M", "%d.%m.%Y", "%d/%m/%Y")
+
+
+def parse_period_datetime(text: str) -> Optional[datetime]:
+    """Parse a period bound as typed by users / the LLM ("2025-02-22 09:00", ISO, dd.mm.yyyy ...)."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in _PERIOD_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    return value if isinstance(value, datetime) else parse_period_datetime(value)
+
+
+def period_epochs(period_start, period_end) -> tuple:
+    """(start_ts, end_ts) epoch seconds for a period, wall-clock times taken as UTC; (None, None) if unparseable."""
+    start, end = _as_datetime(period_start), _as_datetime(period_end)
+    if start is None or end is None or end <= start:
+        return None, None
+    return calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())
+
+
+def normalize_car_number(car_number: str) -> str:
+    """Registration number in canonical form: upper case, no spaces, dashes or dots."""
+    return re.sub(r"[\s\-.·]", "", car_number or "").upper()
+
+
+def reservation_dedup_key(car_number: str, period_start, period_end) -> str:
+    """Duplicate-submission key: normalized car plus the period as epochs (or as squashed text if unparseable)."""
+    start_ts, end_ts = period_epochs(period_start, period_end)
+    if start_ts is None:
+        period = "|".join(" ".join(str(v or "").lower().split()) for v in (period_start, period_end))
+    else:
+        period = f"{start_ts}|{end_ts}"
+    return f"{normalize_car_number(car_number)}|{period}"
+
+
+def car_key(car_number: str) -> int:
+    """Stable 31-bit key of the normalized registration number (R*Tree car dimension)."""
+    return zlib.crc32(normalize_car_number(car_number).encode("utf-8")) & 0x7FFFFFFF
+
+
+def _period_to_slots(period_start, period_end) -> Optional[tuple]:
+    """Hourly slots covering a period: (first_slot, end_slot_exclusive) as datetimes on the hour."""
+    start, end = _as_datetime(period_start), _as_datetime(period_end)
+    if start is None or end is None:
+        return None
+    start = start.replace(minute=0, second=0, microsecond=0)
+    if end.minute or end.second or end.microsecond:
+        end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    if end <= start:
+        return None
+    return start, end
+
+
+class ReservationConflictError(Exception):
+    """Raised when a reservation cannot be approved (slots taken or request already decided)."""
+
+
+# Slot predicates shared by search, claim and release. Parameters come from _slot_params().
+_ROWS_IN_PERIOD = "(slot_date, hour_slot) >= (:d0, :h0) AND (slot_date, hour_slot) < (:d1, :h1)"
+_DAY_MASK = "(CASE slot_date WHEN :d0 THEN :m0 WHEN :d1 THEN :m1 ELSE :full END)"
+
+
+def _slot_params(start: datetime, end: datetime) -> dict:
+    last = end - timedelta(hours=1)
+    d0, h0 = start.date().isoformat(), start.hour
+    d1, h1 = last.date().isoformat(), last.hour + 1
+    return {
+        "d0": d0, "h0": h0, "d1": d1, "h1": h1,
+        "hours": int((end - start).total_seconds() // 3600),
+        "days": (last.date() - start.date()).days + 1,
+        "m0": hour_range_mask(h0, 24 if d0 != d1 else h1),
+        "m1": hour_range_mask(0, h1),
+        "full": FULL_DAY_MASK,
+    }
+
+
+def _find_free_spaces(conn: sqlite3.Connection, params: dict, space_type: str = None, limit: int = -1) -> list:
+    type_join = "JOIN parking_spaces p ON p.space_id = a.space_id AND p.space_type = :type" if space_type else ""
+    params = {**params, "type": space_type, "limit": limit}
+    if get_availability_layout(conn) == "bitmask":
+        sql = f"""SELECT a.space_id FROM availability_days a {type_join}
+                  WHERE slot_date BETWEEN :d0 AND :d1 AND (free_mask & {_DAY_MASK}) = {_DAY_MASK}
+                  GROUP BY a.space_id HAVING COUNT(*) = :days
+                  ORDER BY a.space_id LIMIT :limit"""
+    else:
+        sql = f"""SELECT a.space_id FROM availability a {type_join}
+                  WHERE available = 1 AND {_ROWS_IN_PERIOD}
+                  GROUP BY a.space_id HAVING COUNT(*) = :hours
+                  ORDER BY a.space_id LIMIT :limit"""
+    return [r[0] for r in conn.execute(sql, params).fetchall()]
+
+
+def _mark_slots(conn: sqlite3.Connection, space_id: int, params: dict, free: bool) -> int:
+    """Set the period's slots on one space to free/taken. Returns the number of rows changed."""
+    params = {**params, "space": space_id}
+    if get_availability_layout(conn) == "bitmask":
+        expr = f"free_mask | {_DAY_MASK}" if free else f"free_mask & ~{_DAY_MASK}"
+        sql = f"UPDATE availability_days SET free_mask = {expr} WHERE space_id = :space AND slot_date BETWEEN :d0 AND :d1"
+    else:
+        sql = f"UPDATE availability SET available = {int(free)} WHERE space_id = :space AND {_ROWS_IN_PERIOD}"
+    return conn.execute(sql, params).rowcount
+
+
+def _claim_free_space(conn: sqlite3.Connection, params: dict) -> Optional[int]:
+    """Mark the lowest-numbered space free for the whole period as taken; None if there is none.
+
+    Rows layout: instead of grouping every slot of the period per space, take spaces free in
+    the first slot (already in space_id order in idx_availability_period), skip those with any
+    taken slot in the period, and confirm the candidate's UPDATE touched every hour; a short
+    count means some slots are missing (unseeded days), so the savepoint is rolled back.
+    """
+    if get_availability_layout(conn) == "bitmask":
+        free = _find_free_spaces(conn, params, limit=1)
+        if not free:
+            return None
+        _mark_slots(conn, free[0], params, free=False)
+        return free[0]
+    row = conn.execute(
+        f"""SELECT space_id FROM availability
+            WHERE slot_date = :d0 AND available = 1 AND hour_slot = :h0
+              AND space_id NOT IN (SELECT space_id FROM availability WHERE available = 0 AND {_ROWS_IN_PERIOD})
+            ORDER BY space_id LIMIT 1""",
+        params,
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute("SAVEPOINT claim_space")
+    if _mark_slots(conn, row[0], params, free=False) != params["hours"]:
+        conn.execute("ROLLBACK TO claim_space")
+        conn.execute("RELEASE claim_space")
+        return None
+    conn.execute("RELEASE claim_space")
+    return row[0]
+
+
+def _period_seeded(conn: sqlite3.Connection, params: dict) -> bool:
+    """Whether availability is seeded for every day the period touches."""
+    table = "availability_days" if get_availability_layout(conn) == "bitmask" else "availability"
+    first = date.fromisoformat(params["d0"])
+    return all(
+        conn.execute(
+            f"SELECT 1 FROM {table} WHERE slot_date = ? LIMIT 1", ((first + timedelta(days=d)).isoformat(),)
+        ).fetchone()
+        for d in range(params["days"])
+    )
+
+
+def _seed_period(conn: sqlite3.Connection, params: dict, today: date = None) -> bool:
+    """Seed the period's missing days from today on, in the caller's transaction.
+
+    Approval calls this so periods past the rolling horizon can be claimed. Past days are
+    never seeded (they are pruned). Returns True if every day of the period is now seeded.
+    """
+    today = today or date.today()
+    table = "availability_days" if get_availability_layout(conn) == "bitmask" else "availability"
+    spaces = get_parking_space_count(conn)
+    first = date.fromisoformat(params["d0"])
+    for d in range(params["days"]):
+        day = first + timedelta(days=d)
+        if day >= today and not conn.execute(
+            f"SELECT 1 FROM {table} WHERE slot_date = ? LIMIT 1", (day.isoformat(),)
+        ).fetchone():
+            seed_availability(conn, spaces=spaces, days=1, start=day)
+    return _period_seeded(conn, params)
+
+
+def find_free_spaces(period_start, period_end, space_type: str = None) -> Optional[list]:
+    """Space IDs free for every hourly slot touched by [period_start, period_end).
+
+    Bounds may be datetimes or free-form text. Returns None if the period cannot be
+    parsed (or ends before it starts) or runs past the seeded availability horizon,
+    i.e. when availability is unknown; an empty list means nothing is free.
+    """
+    slots = _period_to_slots(period_start, period_end)
+    if slots is None:
+        return None
+    params = _slot_params(*slots)
+    with db_session() as conn:
+        if not _period_seeded(conn, params):
+            return None
+        return _find_free_spaces(conn, params, space_type)
+
+
+def get_dynamic_snapshot(date_str: str) -> dict:
+    """Hours and prices (cached) plus availability counts for one date."""
+    hours = get_working_hours()
+    prices = get_prices()
+    with db_session() as conn:
+        available, total = _count_availability(conn, date_str)
+    return {
+        "working_hours": hours,
+        "prices": prices,
+        "availability": {"available": available, "total": total, "date": date_str},
+    }
+
+
+def get_data_version() -> tuple:
+    """Token that changes whenever the database changes.
+
+    PRAGMA data_version only moves on commits from *other* connections, so the
+    thread's own total_changes is folded in to catch writes made on this connection.
+    """
+    conn = get_connection()
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+def find_open_reservation_request(car_number: str, period_start: str, period_end: str) -> Optional[dict]:
+    """The pending or approved request for the same car and period, if any (one idx_requests_dedup lookup)."""
+    with db_session() as conn:
+        row = conn.execute(
+            "SELECT id, status FROM reservation_requests WHERE dedup_key = ? AND status <> 'refused'",
+            (reservation_dedup_key(car_number, period_start, period_end),),
+        ).fetchone()
+    return {"id": row[0], "status": row[1]} if row else None
+
+
+def create_reservation_request(name: str, surname: str, car_number: str, period_start: str, period_end: str,
+                               free_spaces: int = None) -> int:
+    """Insert a pending request and return its ID; a repeat of a live request returns the existing ID."""
+    key = reservation_dedup_key(car_number, period_start, period_end)
     with db_session() as conn:
         c = conn.cursor()
         c.execute(
             """INSERT INTO reservation_requests
-               (name, surname, car_number, period_start, period_end, status, created_at)
-               VALUES (?, ?, ?, ?, ?, 'pending', ?)""",
-            (name, surname, car_number, period_start, period_end, datetime.utcnow().isoformat()),
+               (name, surname, car_number, period_start, period_end, status, created_at, free_spaces,
+                period_start_ts, period_end_ts, car_key, dedup_key)
+               VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (dedup_key) WHERE status <> 'refused' DO NOTHING""",
+            (name, surname, car_number, period_start, period_end, datetime.utcnow().isoformat(), free_spaces,
+             *period_epochs(period_start, period_end), car_key(car_number), key),
         )
-        return c.lastrowid
+        if c.rowcount:
+            return c.lastrowid
+        return c.execute(
+            "SELECT id FROM reservation_requests WHERE dedup_key = ? AND status <> 'refused'", (key,)
+        ).fetchone()[0]
 
 
-def get_pending_reservation_requests():
+def find_reservations(window_start, window_end, car_number: str = None, status: Optional[str] = "approved") -> list:
+    """Reservations whose period overlaps [window_start, window_end), via the R*Tree.
+
+    Bounds may be datetimes or text; pass the same moment twice for "which reservations
+    cover this time". Optional car_number narrows to one car (second R*Tree dimension);
+    status=None returns every status. Rows are ordered by period start.
+    """
+    start, end = _as_datetime(window_start), _as_datetime(window_end)
+    if start is None or end is None or end < start:
+        raise ValueError(f"invalid window: {window_start} to {window_end}")
+    ws = calendar.timegm(start.timetuple())
+    we = max(calendar.timegm(end.timetuple()), ws + 1)
+    params = {"ws": ws, "we": we, "ws_min": ws // 60, "we_min": (we + 59) // 60, "status": status}
+    car_filter = ""
+    if car_number:
+        params["car"] = car_key(car_number)
+        params["norm"] = normalize_car_number(car_number)
+        car_filter = "AND p.car_min <= :car AND p.car_max >= :car"
     with db_session() as conn:
-        c = conn.cursor()
-        c.execute(
-            """SELECT id, name, surname, car_number, period_start, period_end, created_at
-               FROM reservation_requests WHERE status = 'pending' ORDER BY created_at"""
-        )
-        return [
-            {"id": r[0], "name": r[1], "surname": r[2], "car_number": r[3],
-             "period_start": r[4], "period_end": r[5], "created_at": r[6]}
-            for r in c.fetchall()
-        ]
+        rows = conn.execute(
+            f"""SELECT r.id, r.name, r.surname, r.car_number, r.period_start, r.period_end, r.status, r.space_id
+                FROM reservation_periods p JOIN reservation_requests r ON r.id = p.id
+                WHERE p.start_min < :we_min AND p.end_min > :ws_min {car_filter}
+                  AND r.period_start_ts < :we AND r.period_end_ts > :ws
+                  AND (:status IS NULL OR r.status = :status)
+                ORDER BY r.period_start_ts, r.id""",
+            params,
+        ).fetchall()
+    result = [
+        {"id": r[0], "name": r[1], "surname": r[2], "car_number": r[3], "period_start": r[4],
+         "period_end": r[5], "status": r[6], "space_id": r[7]}
+        for r in rows
+    ]
+    if car_number:
+        # car_key is a hash: drop the (rare) other cars that share it.
+        result = [r for r in result if normalize_car_number(r["car_number"]) == params["norm"]]
+    return result
+
+
+_PENDING_COLUMNS = "id, name, surname, car_number, period_start, period_end, created_at, free_spaces"
+
+
+def _pending_row(r) -> dict:
+    return {"id": r[0], "name": r[1], "surname": r[2], "car_number": r[3],
+            "period_start": r[4], "period_end": r[5], "created_at": r[6], "free_spaces": r[7]}
+
+
+def get_pending_reservation_requests_page(after: tuple = None, limit: int = 50) -> tuple:
+    """One page of pending requests in (created_at, id) order, plus the cursor for the next page.
+
+    Keyset pagination: `after` is the (created_at, id) of the last row already seen, so each
+    page is an index range scan on idx_requests_status_created regardless of backlog size.
+    Returns (rows, next_after); next_after is None on the last page.
+    """
+    with db_session() as conn:
+        if after is None:
+            rows = conn.execute(
+                f"""SELECT {_PENDING_COLUMNS} FROM reservation_requests
+                    WHERE status = 'pending' ORDER BY created_at, id LIMIT ?""",
+                (limit,),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"""SELECT {_PENDING_COLUMNS} FROM reservation_requests
+                    WHERE status = 'pending' AND (created_at, id) > (?, ?)
+                    ORDER BY created_at, id LIMIT ?""",
+                (after[0], after[1], limit),
+            ).fetchall()
+    page = [_pending_row(r) for r in rows]
+    next_after = (page[-1]["created_at"], page[-1]["id"]) if len(page) == limit else None
+    return page, next_after
 
 
-def set_reservation_status(request_id: int, status: str, admin_comment: str = None):
+def iter_pending_reservation_requests(page_size: int = 50):
+    """Yield pending requests oldest first, fetching one page at a time (constant memory)."""
+    after = None
+    while True:
+        page, after = get_pending_reservation_requests_page(after=after, limit=page_size)
+        yield from page
+        if after is None:
+            return
+
+
+def count_pending_reservation_requests() -> int:
+    with db_session() as conn:
+        return conn.execute("SELECT COUNT(*) FROM reservation_requests WHERE status = 'pending'").fetchone()[0]
+
+
+def get_pending_reservation_requests():
+    return list(iter_pending_reservation_requests(page_size=500))
+
+
+def _decide(conn: sqlite3.Connection, request_id: int, status: str, admin_comment: str, decided_at: str) -> dict:
+    """Apply one decision inside the caller's write transaction; see set_reservation_status()."""
     if status not in ("approved", "refused"):
         raise ValueError("status must be 'approved' or 'refused'")
-    with db_session() as conn:
-        c = conn.cursor()
-        c.execute(
-            """UPDATE reservation_requests SET status = ?, admin_comment = ?, decided_at = ?
-               WHERE id = ?""",
-            (status, admin_comment or "", datetime.utcnow().isoformat(), request_id),
-        )
+    row = conn.execute(
+        "SELECT status, period_start, period_end, space_id, name, surname, car_number FROM reservation_requests WHERE id = ?",
+        (request_id,),
+    ).fetchone()
+    if row is None:
+        raise ValueError(f"no reservation request with ID {request_id}")
+    current, period_start, period_end, space_id = row[0], row[1], row[2], row[3]
+    slots = _period_to_slots(period_start, period_end)
+    if status == "approved":
+        if current != "pending":
+            raise ReservationConflictError(f"request {request_id} is already {current}")
+        if slots is None:
+            raise ValueError(f"request {request_id} has an unreadable period: {period_start} to {period_end}")
+        params = _slot_params(*slots)
+        if not _seed_period(conn, params):
+            raise ValueError(f"request {request_id} has no availability data for {period_start} to {period_end} "
+                             "(past days are pruned)")
+        space_id = _claim_free_space(conn, params)
+        if space_id is None:
+            raise ReservationConflictError(f"no space is free from {period_start} to {period_end}")
+    else:
+        if current == "approved" and space_id is not None and slots is not None:
+            _mark_slots(conn, space_id, _slot_params(*slots), free=True)
+        space_id = None
+    conn.execute(
+        """UPDATE reservation_requests SET status = ?, admin_comment = ?, decided_at = ?, space_id = ?
+           WHERE id = ?""",
+        (status, admin_comment or "", decided_at, space_id, request_id),
+    )
+    return {"id": request_id, "name": row[4], "surname": row[5], "car_number": row[6],
+            "period_start": period_start, "period_end": period_end, "status": status,
+            "admin_comment": admin_comment or "", "decided_at": decided_at, "space_id": space_id}
+
+
+def set_reservation_status(request_id: int, status: str, admin_comment: str = None) -> Optional[int]:
+    """Decide a request. Approval claims a free space for the whole period atomically.
+
+    Runs in one BEGIN IMMEDIATE transaction: the request must still be pending to be
+    approved, and the first free space's slots are marked taken before the status
+    changes; days past the seeded horizon are seeded first. Raises ReservationConflictError
+    if the request was already decided or no space is free, and ValueError if the period
+    is unreadable or has pruned past days (nothing is written). Refusing an approved request releases its slots.
+    Returns the assigned space_id for approvals, None for refusals.
+    """
+    if status not in ("approved", "refused"):
+        raise ValueError("status must be 'approved' or 'refused'")
+    with db_session(immediate=True) as conn:
+        return _decide(conn, request_id, status, admin_comment, datetime.utcnow().isoformat())["space_id"]
+
+
+def set_reservation_statuses(decisions) -> tuple:
+    """Apply many (request_id, status, admin_comment) decisions in one BEGIN IMMEDIATE transaction.
+
+    Each decision follows set_reservation_status() rules. Decisions that cannot be applied
+    (conflict, unknown ID, unreadable or pruned period) are skipped and leave their request
+    untouched; the rest commit together. Returns (decided, failed): the decided rows (id,
+    name, surname, car_number, period_start, period_end, status, admin_comment, decided_at,
+    space_id) and the skipped (request_id, reason) pairs, both in input order.
+    """
+    decisions = list(decisions)
+    for _, status, _ in decisions:
+        if status not in ("approved", "refused"):
+            raise ValueError("status must be 'approved' or 'refused'")
+    decided_at = datetime.utcnow().isoformat()
+    decided = []
+    failed = []
+    with db_session(immediate=True) as conn:
+        for request_id, status, admin_comment in decisions:
+            try:
+                decided.append(_decide(conn, request_id, status, admin_comment, decided_at))
+            except (ReservationConflictError, ValueError) as e:
+                failed.append((request_id, str(e)))
+    return decided, failed
+
+
+def archive_decided_requests(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH,
+                             now: datetime = None) -> dict:
+    """Move decided requests out of the hot reservation_requests table into reservation_history.
+
+    Eligible: refused, or approved with a period that has already ended (or cannot be
+    parsed), decided more than `older_than_days` ago. Moves at most `batch_size` rows per
+    transaction, so it can run next to the chatbot and admin console. IDs are kept, and
+    get_reservation_status() falls back to the history table.
+    Returns {"rows_moved", "batches", "seconds"}.
+    """
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=older_than_days)).isoformat()
+    now_ts = calendar.timegm(now.timetuple())
+    t0 = time.perf_counter()
+    report = {"rows_moved": 0, "batches": 0}
+    while True:
+        with db_session(immediate=True) as conn:
+            ids = [r[0] for r in conn.execute(
+                """SELECT id FROM reservation_requests
+                   WHERE status <> 'pending' AND decided_at < ?
+                     AND (status = 'refused' OR period_end_ts IS NULL OR period_end_ts < ?)
+                   LIMIT ?""",
+                (cutoff, now_ts, batch_size),
+            )]
+            if ids:
+                id_list = json.dumps(ids)
+                conn.execute(
+                    f"""INSERT OR REPLACE INTO reservation_history ({_HISTORY_COLUMNS})
+                        SELECT {_HISTORY_COLUMNS} FROM reservation_requests
+                        WHERE id IN (SELECT value FROM json_each(?))""",
+                    (id_list,),
+                )
+                conn.execute("DELETE FROM reservation_requests WHERE id IN (SELECT value FROM json_each(?))", (id_list,))
+        if not ids:
+            break
+        report["rows_moved"] += len(ids)
+        report["batches"] += 1
+        if len(ids) < batch_size:
+            break
+    report["seconds"] = time.perf_counter() - t0
+    return report
 
 
 def get_reservation_status(request_id: int):
     with db_session() as conn:
         c = conn.cursor()
         c.execute(
-            "SELECT status, admin_comment, period_start, period_end FROM reservation_requests WHERE id = ?",
+            "SELECT status, admin_comment, period_start, period_end, space_id FROM reservation_requests WHERE id = ?",
             (request_id,),
         )
         row = c.fetchone()
+        if not row:
+            c.execute(
+                "SELECT status, admin_comment, period_start, period_end, space_id FROM reservation_history WHERE id = ?",
+                (request_id,),
+            )
+            row = c.fetchone()
         if not row:
             return None
-        return {"status": row[0], "admin_comment": row[1] or "", "period_start": row[2], "period_end": row[3]}
+        return {"status": row[0], "admin_comment": row[1] or "", "period_start": row[2], "period_end": row[3],
+                "space_id": row[4]}
+
+
+def get_reservations_by_car(car_number: str, limit: int = 5) -> list:
+    """Most recent requests for a registration number: live ones newest first, then archived ones.
+
+    Uses idx_requests_car, then idx_history_car when fewer than `limit` live requests match.
+    """
+    norm = normalize_car_number(car_number)
+    if not norm:
+        return []
+    result = []
+    with db_session() as conn:
+        for table in ("reservation_requests", "reservation_history"):
+            rows = conn.execute(
+                f"""SELECT id, car_number, period_start, period_end, status, admin_comment, space_id
+                    FROM {table} WHERE car_key = ? ORDER BY id DESC""",
+                (car_key(norm),),
+            )
+            for r in rows:
+                # car_key is a hash: re-check the plate itself.
+                if normalize_car_number(r[1]) != norm:
+                    continue
+                result.append({"id": r[0], "car_number": r[1], "period_start": r[2], "period_end": r[3],
+                               "status": r[4], "admin_comment": r[5] or "", "space_id": r[6]})
+                if len(result) >= limit:
+                    return result
+    return result
 
 
 if __name__ == "__main__":
-    init_db()
+    stats = init_db()
     print("DB initialized at", SQLITE_PATH)
+    if stats:
+        print(f"Seeded {stats['rows']} availability rows in {stats['seconds']:.2f}s "
+              f"({stats['rows_per_second']:,.0f} rows/s)")
@@ -13,6 +13,27 @@ def measure_latency_single(invoke_fn, query: str, rounds: int = 3) -> dict:
     return {"avg_seconds": sum(times) / len(times), "min_seconds": min(times), "max_seconds": max(times), "rounds": rounds}
 
 
+def measure_time_to_first_token(stream_fn, query: str, rounds: int = 3) -> dict:
+    """Time to first token and to the full reply for stream_fn(query), an iterator of text chunks."""
+    first, total = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        ttft = None
+        for _chunk in stream_fn(query):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        end = time.perf_counter() - start
+        first.append(end if ttft is None else ttft)
+        total.append(end)
+    return {
+        "avg_ttft_seconds": sum(first) / len(first),
+        "min_ttft_seconds": min(first),
+        "max_ttft_seconds": max(first),
+        "avg_total_seconds": sum(total) / len(total),
+        "rounds": rounds,
+    }
+
+
 def _doc_is_relevant(doc: Document, relevant_sources: List[str], content_marker: str = None) -> bool:
     if relevant_sources and doc.metadata.get("source") in relevant_sources:
         return True
@@ -41,3 +62,38 @@ def evaluate_retrieval(vector_store, test_cases: List[dict], k: int = 3) -> dict
         "avg_precision": sum(r["precision_at_k"] for r in results) / len(results) if results else 0,
         "cases": results,
     }
+
+
+def evaluate_intent_router(router, cases: List[tuple], min_confidence: float = None) -> dict:
+    """Routing accuracy on (message, intent) cases, per intent and overall, plus classify latency.
+
+    With min_confidence, also reports how many messages would fall back to the full path.
+    """
+    per_intent = {}
+    correct = 0
+    fallbacks = 0
+    times = []
+    misses = []
+    for text, expected in cases:
+        start = time.perf_counter()
+        predicted, confidence = router.classify(text)
+        times.append(time.perf_counter() - start)
+        stats = per_intent.setdefault(expected, {"cases": 0, "correct": 0})
+        stats["cases"] += 1
+        if predicted == expected:
+            correct += 1
+            stats["correct"] += 1
+        else:
+            misses.append({"text": text, "expected": expected, "predicted": predicted, "confidence": confidence})
+        if min_confidence is not None and confidence < min_confidence:
+            fallbacks += 1
+    for stats in per_intent.values():
+        stats["accuracy"] = stats["correct"] / stats["cases"]
+    return {
+        "accuracy": correct / len(cases) if cases else 0,
+        "per_intent": per_intent,
+        "fallbacks": fallbacks,
+        "avg_ms": sum(times) / len(times) * 1000 if times else 0,
+        "max_ms": max(times) * 1000 if times else 0,
+        "misses": misses,
+    }
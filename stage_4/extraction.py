@@ -0,0 +1,260 @@
+"""Rule-based reservation extraction: names, registration numbers, dates and times.
+
+Fills chatbot.RESERVATION_FIELDS locally for the common phrasings ("my name is John
+Smith, car AB-123-CD, tomorrow from 9am to 5pm", ISO or dd.mm.yyyy timestamps), and
+says whether the message plausibly holds reservation data the rules could not read,
+so the LLM extractor is only called for those.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from db import normalize_car_number
+
+PERIOD_FORMAT = "%Y-%m-%d %H:%M"
+
+# Registration-number-like tokens: upper-case letter and digit groups with optional
+# separators ("AB-123-CD", "BG 1234 AB", "M-AB 123"), at least one of each.
+PLATE_PATTERN = re.compile(
+    r"(?<![\w-])(?=[A-Z0-9 .\-·]*\d)(?=[A-Z0-9 .\-·]*[A-Z])[A-Z0-9]{1,4}(?:[ .\-·][A-Z0-9]{1,4}){0,3}(?![\w-])"
+)
+_TIME_TOKEN = re.compile(r"^\d{1,2}(?:[ .:]?\d{2})?\s?[AP]M$")
+# Groups that make a plate-like token an amount, a unit or a vehicle type ("5 EUR", "SUV 4X4").
+_NOT_PLATE_GROUPS = {
+    "EUR", "USD", "GBP", "CHF", "RSD", "DIN", "HRK", "KM", "KMH", "KWH", "KW", "CM", "MM", "KG",
+    "H", "HR", "HRS", "MIN", "MINS", "SUV", "4X4", "4WD", "AWD", "EV", "LPG", "CNG", "VAN",
+}
+# Make and model rather than a plate: a short all-caps group, then a 2-3 character
+# letter+digit group ("BMW X5", "VW T6", "AUDI A4", "VW ID3").
+_MAKE_MODEL = re.compile(r"^[A-Z]{2,4}[ .\-·](?=[A-Z0-9]{2,3}$)[A-Z]{1,2}\d{1,2}$")
+_GAP = re.compile(r"[\s,]*")
+
+_NAME = r"([A-ZÀ-Ž][\w'’-]+)"
+NAME_PATTERNS = [
+    re.compile(r"(?i:my name is|my name's|i am|i'm|this is|name\s*[:=])\s+" + _NAME + r"\s+" + _NAME),
+    re.compile(r"(?i:name\s*[:=])\s*" + _NAME + r"[\s,;]+(?i:surname\s*[:=])\s*" + _NAME),
+]
+_CAR_CONTEXT = re.compile(
+    r"(?i:car|plate|registration|reg\.?|licen[cs]e)(?:\s+(?i:number|no\.?|plate))?\s*(?i:is|:|=)?\s*"
+)
+
+_MONTHS = {m: i + 1 for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+)}
+_MONTH = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?" \
+         r"|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_CLOCK = r"(?:[T\s]+(?:at\s+)?(?P<{0}_h>\d{{1,2}}):(?P<{0}_m>\d{{2}})(?::\d{{2}})?)?"
+
+# One pass over the message, in order; dates may carry their time, bare times take the
+# nearest date. Alternatives are ordered so a longer form wins over its pieces.
+WHEN_PATTERN = re.compile(
+    r"\b(?:"
+    r"(?P<iso>\d{4}-\d{2}-\d{2})" + _CLOCK.format("iso") +
+    r"|(?P<eu>\d{1,2}[./]\d{1,2}[./]\d{4})" + _CLOCK.format("eu") +
+    r"|(?P<dm_day>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<dm_month>" + _MONTH + r")\.?(?:,?\s+(?P<dm_year>\d{4}))?"
+    r"|(?P<md_month>" + _MONTH + r")\.?\s+(?P<md_day>\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(?P<md_year>\d{4}))?"
+    r"|(?P<rel>day after tomorrow|tomorrow|today|tonight)"
+    r"|(?:next\s+)?(?P<wd>" + "|".join(_WEEKDAYS) + r")"
+    r"|(?P<ap_h>\d{1,2})(?:[:.](?P<ap_m>\d{2}))?\s*(?P<ap>a\.?m\.?|p\.?m\.?)(?!\w)"
+    r"|(?P<hm_h>\d{1,2})(?::|h)(?P<hm_m>\d{2})"
+    r"|(?P<word>noon|midday|midnight)"
+    r")",
+    re.I,
+)
+
+_RESERVATION_HINT = re.compile(
+    r"\b(reserv\w*|book\w*|surname|my name|name is|plate|registration|car number|park(?:ing)? (?:from|on|for))\b",
+    re.I,
+)
+
+
+def _plate_candidates(text: str, units: bool = False) -> list:
+    """Plate-like tokens in order, as (token, is_make_model); times are left out, and so are
+    amounts, units and vehicle types ("5 EUR", "SUV 4X4") unless units=True."""
+    candidates = []
+    for match in PLATE_PATTERN.finditer(text):
+        plate = match.group(0).strip(" .-·")
+        compact = normalize_car_number(plate)
+        if _TIME_TOKEN.match(plate):
+            continue
+        if not units and _NOT_PLATE_GROUPS.intersection(re.split(r"[ .\-·]+", plate)):
+            continue
+        if 4 <= len(compact) <= 10 and re.search(r"\d", compact) and re.search(r"[A-Z]", compact):
+            candidates.append((plate, bool(_MAKE_MODEL.match(plate))))
+    return candidates
+
+
+def find_plate(text: str, units: bool = False) -> Optional[str]:
+    """First registration-number-like token in the text, or None.
+
+    Makes and models ("BMW X5") are skipped, and so are amounts, units and vehicle types
+    ("5 EUR", "SUV 4X4") unless units=True (used right after "car", "plate", ...).
+    """
+    return next((plate for plate, make_model in _plate_candidates(text, units) if not make_model), None)
+
+
+def _find_keyed_car_number(text: str) -> Optional[str]:
+    """Plate right after "car", "plate", "registration ...", or after a make and model there."""
+    for match in _CAR_CONTEXT.finditer(text):
+        pos = match.end()
+        for _ in range(2):
+            token = PLATE_PATTERN.match(text, pos)
+            if not token:
+                break
+            if _MAKE_MODEL.match(token.group(0).strip(" .-·")):
+                pos = _GAP.match(text, token.end()).end()
+                continue
+            plate = find_plate(token.group(0), units=True)
+            if plate:
+                return plate
+            break
+    return None
+
+
+def plate_is_ambiguous(text: str) -> bool:
+    """More than one plate-like token (two plates, or a make/model next to a plate)."""
+    return len(_plate_candidates(text)) > 1
+
+
+def _find_car_number(text: str) -> Optional[str]:
+    # Prefer a plate after a keyword; else any plate-like token.
+    return _find_keyed_car_number(text) or find_plate(text)
+
+
+def _find_name(text: str) -> tuple:
+    for pattern in NAME_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1), match.group(2)
+    return None, None
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _month_day(month: str, day: str, year: Optional[str], today: date) -> Optional[date]:
+    m = _MONTHS[month[:3].lower()]
+    if year:
+        return _safe_date(int(year), m, int(day))
+    d = _safe_date(today.year, m, int(day))
+    if d and d < today:
+        d = _safe_date(today.year + 1, m, int(day))
+    return d
+
+
+def _clock(hour, minute, ampm: str = "") -> Optional[time]:
+    h, m = int(hour), int(minute or 0)
+    ampm = ampm.replace(".", "").lower()
+    if ampm:
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if ampm == "pm" else 0)
+    if h > 23 or m > 59:
+        return None
+    return time(h, m)
+
+
+def _when_tokens(text: str, today: date) -> list:
+    """[(date or None, time or None), ...] in message order."""
+    tokens = []
+    for m in WHEN_PATTERN.finditer(text):
+        g = m.groupdict()
+        d = t = None
+        if g["iso"]:
+            try:
+                d = date.fromisoformat(g["iso"])
+            except ValueError:
+                continue
+            t = _clock(g["iso_h"], g["iso_m"]) if g["iso_h"] else None
+        elif g["eu"]:
+            day, month, year = re.split(r"[./]", g["eu"])
+            d = _safe_date(int(year), int(month), int(day))
+            t = _clock(g["eu_h"], g["eu_m"]) if g["eu_h"] else None
+        elif g["dm_day"]:
+            d = _month_day(g["dm_month"], g["dm_day"], g["dm_year"], today)
+        elif g["md_day"]:
+            d = _month_day(g["md_month"], g["md_day"], g["md_year"], today)
+        elif g["rel"]:
+            rel = g["rel"].lower()
+            d = today + timedelta(days=2 if rel.startswith("day after") else 1 if rel == "tomorrow" else 0)
+        elif g["wd"]:
+            # "Monday" and "next Monday" both mean the coming one (never today).
+            d = today + timedelta(days=(_WEEKDAYS.index(g["wd"].lower()) - today.weekday()) % 7 or 7)
+        elif g["ap_h"]:
+            t = _clock(g["ap_h"], g["ap_m"], g["ap"])
+        elif g["hm_h"]:
+            t = _clock(g["hm_h"], g["hm_m"])
+        elif g["word"]:
+            t = time(0, 0) if g["word"].lower() == "midnight" else time(12, 0)
+        if d is None and t is None:
+            continue
+        tokens.append((d, t))
+    return tokens
+
+
+def _find_period(tokens: list) -> tuple:
+    """(start, end) datetimes from the date/time tokens, or (None, None) if not both are clear."""
+    dates = [d for d, _ in tokens if d]
+    if not dates:
+        return None, None
+    moments = []
+    current = None
+    for d, t in tokens:
+        if d:
+            current = d
+        if t:
+            # Times before any date ("from 9:00 to 17:00 on 22.02.2025") take the first date.
+            moments.append(datetime.combine(current or dates[0], t))
+    if len(moments) < 2:
+        return None, None
+    start, end = moments[0], moments[1]
+    if end <= start and end.date() == start.date():
+        end += timedelta(days=1)  # "from 22:00 to 06:00": overnight
+    if end <= start:
+        return None, None
+    return start, end
+
+
+def extract_reservation_rules(text: str, today: date = None) -> dict:
+    """Reservation fields the rules are sure of; missing ones are simply absent."""
+    today = today or date.today()
+    result = {}
+    name, surname = _find_name(text)
+    if name:
+        result["name"], result["surname"] = name, surname
+    car = _find_car_number(text)
+    if car:
+        result["car_number"] = car
+    start, end = _find_period(_when_tokens(text, today))
+    if start:
+        result["period_start"] = start.strftime(PERIOD_FORMAT)
+        result["period_end"] = end.strftime(PERIOD_FORMAT)
+    return result
+
+
+def merge_llm_extraction(text: str, rules: dict, llm: dict) -> dict:
+    """Combine both extractions: rule values win (normalized dates), except a car number the
+    rules only guessed (no "car"/"plate" keyword before it, or several plate-like tokens)."""
+    merged = {**llm, **rules}
+    guessed = not _find_keyed_car_number(text) or plate_is_ambiguous(text)
+    if llm.get("car_number") and rules.get("car_number") and guessed:
+        merged["car_number"] = llm["car_number"]
+    return merged
+
+
+def needs_llm_extraction(text: str, extracted: dict, fields: list, today: date = None) -> bool:
+    """True when the rules left fields empty but the message plausibly holds reservation data,
+    or filled them all from a message with several plate-like tokens (the LLM picks the plate)."""
+    if all(extracted.get(f) for f in fields):
+        return plate_is_ambiguous(text)
+    if extracted.get("name") or extracted.get("car_number"):
+        return True
+    if not _RESERVATION_HINT.search(text):
+        return False
+    has_when = bool(extracted.get("period_start")) or bool(_when_tokens(text, today or date.today()))
+    return has_when or bool(re.search(r"\b(my name|surname)\b", text, re.I))
@@ -1,27 +1,46 @@
 """Stage 4: LangGraph orchestration of user interaction, admin approval, and data recording.
 
 Graph structure:
-- user_interaction: RAG chatbot + submit reservation + status (context of RAG and chatbot).
+- entry: the local intent router (intent_router.py) picks one node per message.
+- status / submit / faq / chit_chat: dedicated paths; faq goes straight to RAG, chit_chat needs no LLM.
+- user_interaction: status, then submit reservation or RAG chatbot (router unsure or disabled);
+  with SPECULATIVE_RAG_ENABLED the RAG answer runs alongside LLM extraction.
 - data_recording: write confirmed reservation to file (MCP server / function call).
 Admin approval is done in run_admin.py (outside the graph), not as a graph node.
+
+Every node that does I/O has an async twin, so arun_user_turn() lets one event loop
+serve many conversations: LLM calls are awaited, SQLite work runs on db.run_in_db_thread().
 """
-from typing import TypedDict, Optional, Literal
+import threading
+from typing import Callable, Iterator, TypedDict, Optional
 
 # LangGraph 0.0.35 API: no START; use set_conditional_entry_point
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
 
 from chatbot import (
-    build_rag_chain,
+    get_rag_chain,
+    reset_rag_chain,
     get_reply,
+    aget_reply,
+    stream_tokens,
+    submit_or_answer,
+    asubmit_or_answer,
     try_submit_reservation,
+    atry_submit_reservation,
     answer_reservation_status,
+    aanswer_reservation_status,
 )
+from config import INTENT_ROUTER_ENABLED
+from intent_router import get_intent_router, chit_chat_reply
 from reservation_writer import notify_confirmed_reservation
 
 
 class PipelineState(TypedDict, total=False):
     user_input: str
     reply: str
+    intent: Optional[str]
+    on_token: Optional[Callable[[str], None]]  # set by stream_user_turn(); RAG tokens go here as generated
     reservation_id: Optional[int]
     reservation_data: Optional[dict]
     record_requested: bool
@@ -39,15 +58,72 @@ def user_interaction(state: PipelineState) -> PipelineState:
     if status_reply is not None:
         return {"reply": status_reply}
 
-    submitted, submit_reply = try_submit_reservation(user_input)
-    if submitted:
-        return {"reply": submit_reply}
+    # Reservation or RAG answer; with SPECULATIVE_RAG_ENABLED both start together.
+    reply = submit_or_answer(get_rag_chain(), user_input, on_token=state.get("on_token"))
+    return {"reply": reply}
+
+
+def status_node(state: PipelineState) -> PipelineState:
+    """Node: reservation status by request ID or car; RAG asks for the ID when neither is given."""
+    user_input = state["user_input"].strip()
+    reply = answer_reservation_status(user_input)
+    if reply is None:
+        reply = get_reply(get_rag_chain(), user_input, on_token=state.get("on_token"), use_cache=False)
+    return {"reply": reply, "intent": "status"}
+
+
+def submit_node(state: PipelineState) -> PipelineState:
+    """Node: submit a reservation; RAG explains what is missing when the details are incomplete."""
+    user_input = state["user_input"].strip()
+    submitted, reply = try_submit_reservation(user_input)
+    if not submitted:
+        reply = get_reply(get_rag_chain(), user_input, on_token=state.get("on_token"), use_cache=False)
+    return {"reply": reply, "intent": "submit"}
+
+
+def faq_node(state: PipelineState) -> PipelineState:
+    """Node: RAG answer only (no status lookup, no reservation extraction)."""
+    reply = get_reply(get_rag_chain(), state["user_input"].strip(), on_token=state.get("on_token"))
+    return {"reply": reply, "intent": "faq"}
+
+
+def chit_chat_node(state: PipelineState) -> PipelineState:
+    """Node: canned reply to greetings and thanks, no LLM call."""
+    return {"reply": chit_chat_reply(state["user_input"]), "intent": "chit_chat"}
 
-    rag = build_rag_chain()
-    reply = get_reply(rag, user_input)
+
+async def auser_interaction(state: PipelineState) -> PipelineState:
+    user_input = (state.get("user_input") or "").strip()
+    if not user_input:
+        return {"reply": "Please enter a message."}
+    status_reply = await aanswer_reservation_status(user_input)
+    if status_reply is not None:
+        return {"reply": status_reply}
+    reply = await asubmit_or_answer(get_rag_chain(), user_input, on_token=state.get("on_token"))
     return {"reply": reply}
 
 
+async def astatus_node(state: PipelineState) -> PipelineState:
+    user_input = state["user_input"].strip()
+    reply = await aanswer_reservation_status(user_input)
+    if reply is None:
+        reply = await aget_reply(get_rag_chain(), user_input, on_token=state.get("on_token"), use_cache=False)
+    return {"reply": reply, "intent": "status"}
+
+
+async def asubmit_node(state: PipelineState) -> PipelineState:
+    user_input = state["user_input"].strip()
+    submitted, reply = await atry_submit_reservation(user_input)
+    if not submitted:
+        reply = await aget_reply(get_rag_chain(), user_input, on_token=state.get("on_token"), use_cache=False)
+    return {"reply": reply, "intent": "submit"}
+
+
+async def afaq_node(state: PipelineState) -> PipelineState:
+    reply = await aget_reply(get_rag_chain(), state["user_input"].strip(), on_token=state.get("on_token"))
+    return {"reply": reply, "intent": "faq"}
+
+
 def data_recording(state: PipelineState) -> PipelineState:
     """Node: write confirmed reservation to file (Name | Car Number | Reservation Period | Approval Time)."""
     data = state.get("reservation_data")
@@ -67,40 +143,94 @@ def data_recording(state: PipelineState) -> PipelineState:
     return {"recorded": True}
 
 
-def route_after_start(state: PipelineState) -> Literal["user_interaction", "data_recording"]:
-    """If we have reservation_data and record_requested, go to data_recording; else user_interaction."""
+ROUTES = ("user_interaction", "status", "submit", "faq", "chit_chat", "data_recording")
+
+
+def route_after_start(state: PipelineState) -> str:
+    """data_recording for a requested record; else the intent router's node, or user_interaction if unsure."""
     if state.get("record_requested") and state.get("reservation_data"):
         return "data_recording"
-    return "user_interaction"
+    user_input = (state.get("user_input") or "").strip()
+    if not INTENT_ROUTER_ENABLED or not user_input:
+        return "user_interaction"
+    return get_intent_router().route(user_input) or "user_interaction"
 
 
 def build_pipeline():
     """Build and compile the LangGraph pipeline (LangGraph 0.0.35 API)."""
     graph = StateGraph(PipelineState)
 
-    graph.add_node("user_interaction", user_interaction)
+    # invoke() runs the sync function, ainvoke() the async twin.
+    graph.add_node("user_interaction", RunnableLambda(user_interaction, afunc=auser_interaction))
+    graph.add_node("status", RunnableLambda(status_node, afunc=astatus_node))
+    graph.add_node("submit", RunnableLambda(submit_node, afunc=asubmit_node))
+    graph.add_node("faq", RunnableLambda(faq_node, afunc=afaq_node))
+    graph.add_node("chit_chat", chit_chat_node)
     graph.add_node("data_recording", data_recording)
 
-    graph.set_conditional_entry_point(
-        route_after_start,
-        {"user_interaction": "user_interaction", "data_recording": "data_recording"},
-    )
-    graph.add_edge("user_interaction", END)
-    graph.add_edge("data_recording", END)
+    graph.set_conditional_entry_point(route_after_start, {name: name for name in ROUTES})
+    for name in ROUTES:
+        graph.add_edge(name, END)
 
     return graph.compile()
 
 
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Process-wide compiled pipeline: compiled on first use, then reused."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = build_pipeline()
+    return _pipeline
+
+
+def warmup() -> None:
+    """Compile the pipeline, train the intent router and build the RAG chain up front."""
+    get_pipeline()
+    get_intent_router()
+    get_rag_chain()
+
+
+def reset() -> None:
+    """Drop the shared pipeline and RAG chain; they are rebuilt lazily on next use."""
+    global _pipeline
+    with _pipeline_lock:
+        _pipeline = None
+    reset_rag_chain()
+
+
 def run_user_turn(user_input: str) -> str:
     """Run one user turn through the pipeline. Returns assistant reply."""
-    pipeline = build_pipeline()
+    pipeline = get_pipeline()
     result = pipeline.invoke({"user_input": user_input})
     return result.get("reply", "")
 
 
+async def arun_user_turn(user_input: str, on_token: Callable[[str], None] = None) -> str:
+    """run_user_turn() for asyncio servers: awaits the LLM and keeps SQLite off the event loop."""
+    state = {"user_input": user_input}
+    if on_token:
+        state["on_token"] = on_token
+    result = await get_pipeline().ainvoke(state)
+    return result.get("reply", "")
+
+
+def stream_user_turn(user_input: str) -> Iterator[str]:
+    """Run one user turn, yielding the reply as it is generated (RAG tokens; other replies arrive whole)."""
+    pipeline = get_pipeline()
+    return stream_tokens(
+        lambda on_token: pipeline.invoke({"user_input": user_input, "on_token": on_token}).get("reply", "")
+    )
+
+
 def run_record_reservation(reservation_data: dict, approval_time: str) -> bool:
     """Run data_recording node for an approved reservation. Returns True if written."""
     data = {**reservation_data, "approval_time": approval_time}
-    pipeline = build_pipeline()
+    pipeline = get_pipeline()
     result = pipeline.invoke({"reservation_data": data, "record_requested": True})
     return result.get("recorded", False)
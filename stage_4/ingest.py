@@ -19,7 +19,10 @@ def main():
         sys.exit(1)
 
     print("Initializing SQLite...")
-    init_db()
+    stats = init_db()
+    if stats:
+        print(f"Seeded {stats['rows']} availability rows in {stats['seconds']:.2f}s "
+              f"({stats['rows_per_second']:,.0f} rows/s)")
     print("Building vector store...")
     build_vector_store(overwrite=True)
     print("Done. Run: python run_chatbot.py, python run_admin.py, python run_orchestrated.py, optionally python run_server.py")
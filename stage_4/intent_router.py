@@ -0,0 +1,108 @@
+"""Local intent router: status / submit / faq / chit_chat, no LLM call.
+
+Multinomial naive Bayes over word unigrams and bigrams plus a few structural markers
+(registration number, date/time, request number, "my name is ..."), trained at first
+use from data_gen.INTENT_EXAMPLES. A prediction below INTENT_MIN_CONFIDENCE routes to
+None, and graph.py falls back to the full status -> extraction -> RAG sequence.
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Optional
+
+from config import INTENT_MIN_CONFIDENCE
+from data_gen import INTENT_EXAMPLES
+from extraction import NAME_PATTERNS, WHEN_PATTERN, find_plate
+
+INTENTS = ("status", "submit", "faq", "chit_chat")
+
+_WORD = re.compile(r"[a-zà-ž']+|\d+", re.I)
+
+
+def message_features(text: str) -> list:
+    words = [w.lower() for w in _WORD.findall(text or "")]
+    words = ["<num>" if w.isdigit() else w for w in words]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if find_plate(text):
+        features.append("<plate>")
+    if WHEN_PATTERN.search(text):
+        features.append("<when>")
+    if any(p.search(text) for p in NAME_PATTERNS):
+        features.append("<name>")
+    if len(words) <= 3:
+        features.append("<short>")
+    return features
+
+
+class IntentRouter:
+    def __init__(self, examples: list = INTENT_EXAMPLES, alpha: float = 1.0):
+        self.alpha = alpha
+        self.counts = defaultdict(Counter)
+        self.totals = Counter()
+        self.priors = Counter()
+        for text, intent in examples:
+            features = message_features(text)
+            self.counts[intent].update(features)
+            self.totals[intent] += len(features)
+            self.priors[intent] += 1
+        self.vocabulary = set().union(*self.counts.values())
+        self.examples = len(examples)
+
+    def scores(self, text: str) -> dict:
+        """Posterior probability per intent."""
+        features = [f for f in message_features(text) if f in self.vocabulary]
+        v = len(self.vocabulary)
+        log = {}
+        for intent in self.priors:
+            denom = self.totals[intent] + self.alpha * v
+            log[intent] = math.log(self.priors[intent] / self.examples) + sum(
+                math.log((self.counts[intent][f] + self.alpha) / denom) for f in features
+            )
+        top = max(log.values())
+        exp = {k: math.exp(s - top) for k, s in log.items()}
+        total = sum(exp.values())
+        return {k: e / total for k, e in exp.items()}
+
+    def classify(self, text: str) -> tuple:
+        """(intent, confidence) for the most probable intent."""
+        scores = self.scores(text)
+        intent = max(scores, key=scores.get)
+        return intent, scores[intent]
+
+    def route(self, text: str, min_confidence: float = INTENT_MIN_CONFIDENCE) -> Optional[str]:
+        """Intent to route to, or None when the router is not confident enough."""
+        intent, confidence = self.classify(text)
+        return intent if confidence >= min_confidence else None
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    """Process-wide router, trained on first use (a few milliseconds)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
+
+
+_GREETING = re.compile(r"\b(hi|hello|hey|good (morning|afternoon|evening))\b", re.I)
+_THANKS = re.compile(r"\b(thanks|thank you|thx|great|cool|helpful)\b", re.I)
+_BYE = re.compile(r"\b(bye|goodbye|see you|that's all)\b", re.I)
+
+
+def chit_chat_reply(text: str) -> str:
+    """Canned reply for greetings, thanks and goodbyes."""
+    if _BYE.search(text):
+        return "Goodbye! Come back any time you need parking at Central Garage."
+    if _THANKS.search(text):
+        return "You're welcome! Anything else about parking or your reservation?"
+    if _GREETING.search(text):
+        return ("Hello! I'm the Central Garage assistant. Ask me about location, hours, prices, "
+                "or give me your details to reserve a space.")
+    return ("I'm the Central Garage assistant. I can answer questions about the parking, "
+            "take a reservation, or check a reservation's status.")
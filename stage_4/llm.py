@@ -0,0 +1,74 @@
+"""Shared LLM clients per (model, temperature), over one keep-alive HTTP session and the completion cache."""
+import threading
+
+import requests
+from langchain.llms import OpenAI
+
+from config import OPENAI_MODEL, LLM_HTTP_POOL_SIZE
+from llm_cache import install_llm_cache
+
+_clients = {}
+_clients_lock = threading.Lock()
+_session = None
+
+
+class _SharedSession(requests.Session):
+    """Session shared by all threads: openai 0.27 close()s each thread's session every
+    180 seconds, which would drop every thread's pooled connections, so close() is a no-op."""
+
+    def close(self) -> None:
+        pass
+
+    def close_pool(self) -> None:
+        super().close()
+
+
+def get_http_session():
+    """Process-wide requests.Session used by the openai package (pooled, keep-alive connections).
+
+    openai 0.27 otherwise opens a session per thread and recycles it every few minutes,
+    so each worker thread pays its own TCP/TLS handshake.
+    """
+    global _session
+    if _session is None:
+        with _clients_lock:
+            if _session is None:
+                import openai
+                from requests.adapters import HTTPAdapter
+
+                session = _SharedSession()
+                adapter = HTTPAdapter(pool_connections=LLM_HTTP_POOL_SIZE, pool_maxsize=LLM_HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                openai.requestssession = session
+                _session = session
+    return _session
+
+
+def get_llm(model: str = OPENAI_MODEL, temperature: float = 0, streaming: bool = False):
+    """Shared LangChain OpenAI client for (model, temperature, streaming); built on first use."""
+    key = (model, float(temperature), streaming)
+    llm = _clients.get(key)
+    if llm is None:
+        get_http_session()
+        install_llm_cache()
+        with _clients_lock:
+            llm = _clients.get(key)
+            if llm is None:
+                llm = OpenAI(model=model, temperature=temperature, streaming=streaming)
+                _clients[key] = llm
+    return llm
+
+
+def reset_llm_clients() -> None:
+    """Drop shared clients and the HTTP session (e.g. after changing the API key or base URL)."""
+    global _session
+    import openai
+
+    with _clients_lock:
+        _clients.clear()
+        if _session is not None:
+            _session.close_pool()
+            if openai.requestssession is _session:
+                openai.requestssession = None
+            _session = None
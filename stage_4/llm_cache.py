@@ -0,0 +1,147 @@
+"""Persistent exact-match LLM completion cache (SQLite, size-bounded LRU).
+
+Installed as langchain.llm_cache by llm.get_llm(), so every LLM call in stage_4
+(RAG chain, reservation extraction, admin agent) is looked up here first. The key is
+a hash of LangChain's llm_string (model, temperature and other call parameters) and
+the full prompt; the RAG prompt embeds the dynamic data, so a change in prices or
+availability is a different key, not a stale hit.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from langchain.cache import BaseCache
+from langchain.schema import Generation
+
+from config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, SQLITE_BUSY_TIMEOUT_MS
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class SQLiteLRUCache(BaseCache):
+    """Completions stored in one table; the least recently used rows go once max_entries is exceeded."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    generations TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list]:
+        key = cache_key(prompt, llm_string)
+        with self._connection() as conn:
+            row = conn.execute("SELECT generations FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        return [Generation(**g) for g in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: list) -> None:
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        generations = json.dumps([g.dict() for g in return_val])
+        with self._connection() as conn:
+            conn.execute(
+                """INSERT INTO llm_cache (key, generations, created_at, last_used) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET generations = excluded.generations, last_used = excluded.last_used""",
+                (cache_key(prompt, llm_string), generations, now, now),
+            )
+            evicted = conn.execute(
+                """DELETE FROM llm_cache WHERE key IN (
+                       SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,),
+            ).rowcount
+        self._count("writes")
+        if evicted:
+            self._count("evicted", evicted)
+
+    def clear(self, **kwargs) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        """This process's hits/misses/writes/evictions, plus entries and lifetime hits on disk."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        entries, stored_hits = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache"
+        ).fetchone()
+        stats.update(entries=entries, max_entries=self.max_entries, stored_hits=stored_hits)
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[SQLiteLRUCache]:
+    """The process-wide completion cache, or None when LLM_CACHE_MAX_ENTRIES is 0."""
+    global _cache
+    if LLM_CACHE_MAX_ENTRIES <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLiteLRUCache()
+    return _cache
+
+
+def install_llm_cache() -> Optional[SQLiteLRUCache]:
+    """Route every LangChain LLM call in this process through the completion cache."""
+    import langchain
+
+    cache = get_llm_cache()
+    if cache is not None and langchain.llm_cache is None:
+        langchain.llm_cache = cache
+    return cache
+
+
+@contextmanager
+def llm_cache_disabled():
+    """Temporarily bypass the completion cache process-wide (e.g. to time real LLM calls)."""
+    import langchain
+
+    saved = langchain.llm_cache
+    langchain.llm_cache = None
+    try:
+        yield
+    finally:
+        langchain.llm_cache = saved
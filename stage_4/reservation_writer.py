@@ -8,6 +8,21 @@ from config import (
 )
 
 
+def _format_line(name: str, surname: str, car_number: str, period_start: str, period_end: str,
+                 approval_time: str) -> str:
+    full_name = f"{name} {surname}".strip()
+    reservation_period = f"{period_start} to {period_end}"
+    return f"{full_name} | {car_number} | {reservation_period} | {approval_time}\n"
+
+
+def _append_lines(lines) -> str:
+    path = Path(CONFIRMED_RESERVATIONS_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+    return str(path)
+
+
 def write_confirmed_reservation(
     name: str,
     surname: str,
@@ -16,14 +31,15 @@ def write_confirmed_reservation(
     period_end: str,
     approval_time: str,
 ) -> str:
-    full_name = f"{name} {surname}".strip()
-    reservation_period = f"{period_start} to {period_end}"
-    line = f"{full_name} | {car_number} | {reservation_period} | {approval_time}\n"
-    path = Path(CONFIRMED_RESERVATIONS_FILE)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(line)
-    return str(path)
+    return _append_lines([_format_line(name, surname, car_number, period_start, period_end, approval_time)])
+
+
+def write_confirmed_reservations(rows: list) -> str:
+    """Append many confirmed reservations with one write. Each row has the write_confirmed_reservation fields."""
+    return _append_lines([
+        _format_line(r["name"], r["surname"], r["car_number"], r["period_start"], r["period_end"], r["approval_time"])
+        for r in rows
+    ])
 
 
 def notify_confirmed_reservation(req: dict, approval_time: str) -> None:
@@ -59,3 +75,33 @@ def notify_confirmed_reservation(req: dict, approval_time: str) -> None:
         period_end=req["period_end"],
         approval_time=approval_time,
     )
+
+
+def notify_confirmed_reservations(reqs: list) -> None:
+    """Batch notify_confirmed_reservation: one POST /confirmed/batch, or one file append.
+
+    Each req dict carries its own approval_time.
+    """
+    if not reqs:
+        return
+    rows = [
+        {k: r[k] for k in ("name", "surname", "car_number", "period_start", "period_end", "approval_time")}
+        for r in reqs
+    ]
+    if RESERVATION_SERVER_URL:
+        try:
+            import urllib.request
+            import json
+            request = urllib.request.Request(
+                f"{RESERVATION_SERVER_URL.rstrip('/')}/confirmed/batch",
+                data=json.dumps({"items": rows}).encode("utf-8"),
+                method="POST",
+                headers={"Content-Type": "application/json"},
+            )
+            if RESERVATION_SERVER_API_KEY:
+                request.add_header("X-API-Key", RESERVATION_SERVER_API_KEY)
+            urllib.request.urlopen(request, timeout=30)
+            return
+        except Exception:
+            pass
+    write_confirmed_reservations(rows)
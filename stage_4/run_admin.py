@@ -4,51 +4,92 @@ print("SSL certs are patched:", _patched_create_default_context)
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-from datetime import datetime
-from db import get_pending_reservation_requests, set_reservation_status
+import argparse
+from db import (
+    count_pending_reservation_requests,
+    iter_pending_reservation_requests,
+    set_reservation_statuses,
+    find_free_spaces,
+    period_epochs,
+)
 from admin_agent import format_reservation_request_for_admin
-from reservation_writer import notify_confirmed_reservation
+from reservation_writer import notify_confirmed_reservations
+
+
+def apply_decisions(buffer: list) -> None:
+    """Save buffered decisions in one transaction, then write all approvals in one batch."""
+    if not buffer:
+        return
+    decided, failed = set_reservation_statuses([(d["id"], d["status"], d["comment"]) for d in buffer])
+    for request_id, reason in failed:
+        print(f"  Request {request_id}: not saved ({reason}); it stays as it was.")
+    approved = [{**r, "approval_time": r["decided_at"]} for r in decided if r["status"] == "approved"]
+    for r in approved:
+        print(f"  Request {r['id']}: approved, space {r['space_id']} reserved.")
+    for r in decided:
+        if r["status"] == "refused":
+            print(f"  Request {r['id']}: refused.")
+    try:
+        notify_confirmed_reservations(approved)
+        if approved:
+            print(f"  → {len(approved)} approval(s) written to confirmed reservations.\n")
+    except Exception as e:
+        print(f"  → Approvals saved in DB. Write to file failed: {e}\n")
+    buffer.clear()
 
 
 def main():
-    pending = get_pending_reservation_requests()
-    if not pending:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="decisions saved per transaction / confirmed-file write (default: 1, immediate)")
+    args = parser.parse_args()
+
+    total = count_pending_reservation_requests()
+    if not total:
         print("No pending reservation requests.")
         return
 
-    print(f"--- {len(pending)} pending request(s) ---\n")
-    for req in pending:
-        print(f"Request ID: {req['id']}")
-        print(f"  {req['name']} {req['surname']} | Car: {req['car_number']}")
-        print(f"  Period: {req['period_start']} → {req['period_end']}")
-        print(f"  Submitted: {req['created_at']}")
-        try:
-            summary = format_reservation_request_for_admin(req)
-            print(f"  Summary: {summary}")
-        except Exception as e:
-            print(f"  (Summary unavailable: {e})")
-        print()
-
-        while True:
-            action = input(f"  [a]pprove / [r]efuse / [s]kip? ").strip().lower()
-            if action in ("a", "approve"):
-                approval_time = datetime.utcnow().isoformat()
-                set_reservation_status(req["id"], "approved")
-                try:
-                    notify_confirmed_reservation(req, approval_time)
-                    print("  → Approved and written to confirmed reservations file.\n")
-                except Exception as e:
-                    print(f"  → Approved (DB updated). Write to file failed: {e}\n")
-                break
-            if action in ("r", "refuse"):
-                comment = input("  Optional comment: ").strip()
-                set_reservation_status(req["id"], "refused", admin_comment=comment)
-                print("  → Refused.\n")
-                break
-            if action in ("s", "skip"):
-                print("  Skipped.\n")
-                break
-            print("  Enter a, r, or s.")
+    print(f"--- {total} pending request(s) ---\n")
+    buffer = []
+    try:
+        for req in iter_pending_reservation_requests():
+            print(f"Request ID: {req['id']}")
+            print(f"  {req['name']} {req['surname']} | Car: {req['car_number']}")
+            print(f"  Period: {req['period_start']} → {req['period_end']}")
+            print(f"  Submitted: {req['created_at']}")
+            free = find_free_spaces(req["period_start"], req["period_end"])
+            if free is None and period_epochs(req["period_start"], req["period_end"])[0] is None:
+                print("  ⚠ Period could not be parsed; check it before approving.")
+            elif free is None:
+                print("  ⚠ Period runs past the seeded availability horizon; approving seeds those days.")
+            elif not free:
+                print("  ⚠ No space is free for the whole period.")
+            else:
+                print(f"  Free spaces for the period: {len(free)}")
+            try:
+                summary = format_reservation_request_for_admin(req)
+                print(f"  Summary: {summary}")
+            except Exception as e:
+                print(f"  (Summary unavailable: {e})")
+            print()
+
+            while True:
+                action = input(f"  [a]pprove / [r]efuse / [s]kip? ").strip().lower()
+                if action in ("a", "approve"):
+                    buffer.append({"id": req["id"], "status": "approved", "comment": ""})
+                    break
+                if action in ("r", "refuse"):
+                    comment = input("  Optional comment: ").strip()
+                    buffer.append({"id": req["id"], "status": "refused", "comment": comment})
+                    break
+                if action in ("s", "skip"):
+                    print("  Skipped.\n")
+                    break
+                print("  Enter a, r, or s.")
+            if len(buffer) >= args.batch_size:
+                apply_decisions(buffer)
+    finally:
+        apply_decisions(buffer)
 
     print("Done.")
 
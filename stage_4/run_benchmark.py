@@ -0,0 +1,199 @@
+"""Run Stage 4 micro-benchmarks. Run from stage_4: python run_benchmark.py <name>"""
+from serbia_ssl_patch import _patched_create_default_context
+print("SSL certs are patched:", _patched_create_default_context)
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+import argparse
+
+import benchmark
+
+
+def _print_timing(label: str, t: dict):
+    print(f"{label}: avg={t['avg_seconds'] * 1000:.2f}ms min={t['min_seconds'] * 1000:.2f}ms "
+          f"max={t['max_seconds'] * 1000:.2f}ms ({t['rounds']} rounds)")
+
+
+def run_turn_setup(args):
+    res = benchmark.bench_turn_setup(rounds=args.rounds)
+    _print_timing("Per-turn build (before)", res["before"])
+    print(f"One-time warmup: {res['warmup_seconds'] * 1000:.2f}ms")
+    _print_timing("Shared singleton (after)", res["after"])
+
+
+def run_indexes(args):
+    res = benchmark.bench_availability_indexes(rows=args.rows, requests=args.requests, rounds=args.rounds)
+    print(f"{res['availability_rows']} availability rows, {res['requests']} reservation requests ({res['path']})")
+    for phase in ("before", "after"):
+        if phase == "after":
+            print(f"Migrations applied in {res['migrate_seconds']:.2f}s")
+        _print_timing(f"[{phase}] availability summary", res[phase]["summary"])
+        _print_timing(f"[{phase}] pending queue", res[phase]["pending"])
+        for line in res[phase]["plans"]:
+            print(f"  plan: {line}")
+
+
+def run_seed(args):
+    res = benchmark.bench_seed(spaces=args.spaces, days=args.days, baseline_days=args.baseline_days)
+    for label in ("loop", "bulk"):
+        r = res[label]
+        print(f"{label}: {r['rows']} rows in {r['seconds']:.2f}s ({r['rows_per_second']:,.0f} rows/s)")
+
+
+def run_layouts(args):
+    res = benchmark.bench_layouts(spaces=args.spaces, days=args.days, rounds=args.rounds)
+    for layout, r in res.items():
+        print(f"[{layout}] {r['rows']} rows, {r['file_bytes'] / 1e6:.1f} MB")
+        _print_timing(f"[{layout}] day summary", r["summary"])
+        _print_timing(f"[{layout}] free 09:00-17:00", r["range"])
+
+
+def run_free_spaces(args):
+    res = benchmark.bench_free_spaces(spaces=args.spaces, days=args.days, period_days=args.period_days,
+                                      rounds=args.rounds)
+    print(f"Period: {res['period']}")
+    for layout, r in res["layouts"].items():
+        print(f"[{layout}] {r['free']} spaces free")
+        _print_timing(f"[{layout}] any type", r["any"])
+        _print_timing(f"[{layout}] space_type=wide", r["typed"])
+
+
+def run_approvals(args):
+    res = benchmark.bench_approvals(threads=args.threads, requests=args.requests, spaces=args.spaces)
+    print(f"{res['threads']} threads: {res['approved']} approved, {res['conflicts']} conflicts, "
+          f"{res['errors']} errors in {res['seconds']:.2f}s")
+    print(f"{res['decisions_per_second']:.0f} decisions/s, {res['approvals_per_second']:.0f} approvals/s")
+    print(f"Double bookings: {res['double_bookings']}; availability consistent: {res['slots_consistent']}")
+
+
+def run_bulk_decisions(args):
+    res = benchmark.bench_bulk_decisions(decisions=args.decisions, single=args.single)
+    for mode, r in res.items():
+        print(f"{mode}: {r['decisions']} decisions in {r['seconds']:.2f}s ({r['per_second']:,.0f}/s)")
+
+
+def run_periods(args):
+    res = benchmark.bench_reservation_periods(reservations=args.reservations, rounds=args.rounds)
+    print(f"{res['reservations']} reservations loaded in {res['load_seconds']:.1f}s")
+    print(f"Approved covering Saturday 10:00: {res['covering_at']} (scan: {res['covering_at_scan']})")
+    _print_timing("text parse scan", res["text_scan"])
+    _print_timing("epoch column scan", res["epoch_scan"])
+    _print_timing("R*Tree point query", res["rtree_at"])
+    _print_timing("car + month, scan", res["scan_car_window"])
+    _print_timing("car + month, R*Tree", res["rtree_car_window"])
+
+
+def run_llm_clients(args):
+    res = benchmark.bench_llm_clients(calls=args.calls, threads=args.threads)
+    print(f"{res['calls']} stub completions from {res['threads']} threads")
+    for mode in ("per_call", "shared"):
+        r = res[mode]
+        print(f"{mode}: {r['ms_per_call']:.2f}ms/call, {r['connections']} TCP connections ({r['seconds']:.2f}s total)")
+    _print_timing("OpenAI(...) construction", res["construct"])
+    _print_timing("get_llm() lookup", res["lookup"])
+
+
+def run_answer_cache(args):
+    res = benchmark.bench_answer_cache(threshold=args.threshold, capacity=args.capacity, passes=args.passes)
+    print(f"{res['questions']} questions, threshold {res['threshold']}: {res['hits']} hits "
+          f"({res['exact_hits']} exact), {res['misses']} misses, hit rate {res['hit_rate']:.0%}")
+    print(f"Wrong hits (answer from another question group): {res['wrong_hits']} "
+          f"({res['near_miss_wrong_hits']} on near-miss questions); "
+          f"{res['rejected']} lookups refused for differing numbers or days")
+    print(f"Avg lookup (incl. embedding call): {res['avg_lookup_ms']:.1f}ms")
+
+
+def run_extraction(args):
+    res = benchmark.bench_extraction(rounds=args.rounds)
+    print(f"{res['messages']} messages: LLM extraction calls {res['llm_calls_before']} -> {res['llm_calls_after']} "
+          f"({res['rules']} complete by rules, {res['skipped']} with nothing to extract)")
+    print(f"Rules correct on {res['correct']}/{res['expected']} complete reservations; "
+          f"{res['per_message_ms']:.3f}ms per message")
+
+
+def run_speculative(args):
+    res = benchmark.bench_speculative(extract_ms=args.extract_ms, rag_ms=args.rag_ms, rounds=args.rounds)
+    print(f"Simulated LLM: extraction {res['extract_ms']:.0f}ms, RAG answer {res['rag_ms']:.0f}ms")
+    for label in ("serial", "speculative"):
+        for kind, t in res[label].items():
+            _print_timing(f"{label} {kind}", t)
+            print(f"    LLM calls per turn: {t['llm_calls']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="name", required=True)
+
+    p = sub.add_parser("turn-setup", help="pipeline + RAG chain setup cost per turn")
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=run_turn_setup)
+
+    p = sub.add_parser("indexes", help="availability / pending queries before and after index migrations")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--requests", type=int, default=100_000)
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=run_indexes)
+
+    p = sub.add_parser("seed", help="availability seeding throughput")
+    p.add_argument("--spaces", type=int, default=450)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--baseline-days", type=int, default=7)
+    p.set_defaults(func=run_seed)
+
+    p = sub.add_parser("layouts", help="row-per-hour vs. bitmask availability layout")
+    p.add_argument("--spaces", type=int, default=450)
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--rounds", type=int, default=50)
+    p.set_defaults(func=run_layouts)
+
+    p = sub.add_parser("free-spaces", help="find_free_spaces() over a multi-day period")
+    p.add_argument("--spaces", type=int, default=450)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--period-days", type=int, default=3)
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=run_free_spaces)
+
+    p = sub.add_parser("approvals", help="concurrent approvals of overlapping requests")
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--requests", type=int, default=800)
+    p.add_argument("--spaces", type=int, default=20)
+    p.set_defaults(func=run_approvals)
+
+    p = sub.add_parser("bulk-decisions", help="per-request vs. bulk admin decisions")
+    p.add_argument("--decisions", type=int, default=10_000)
+    p.add_argument("--single", type=int, default=1_000, help="decisions to time in per-request mode")
+    p.set_defaults(func=run_bulk_decisions)
+
+    p = sub.add_parser("periods", help="reservation overlap queries on the R*Tree")
+    p.add_argument("--reservations", type=int, default=1_000_000)
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=run_periods)
+
+    p = sub.add_parser("llm-clients", help="per-call vs. shared OpenAI client against a local stub server")
+    p.add_argument("--calls", type=int, default=200)
+    p.add_argument("--threads", type=int, default=4)
+    p.set_defaults(func=run_llm_clients)
+
+    p = sub.add_parser("answer-cache", help="semantic answer cache hit rate on paraphrased questions")
+    p.add_argument("--threshold", type=float, default=None, help="default: ANSWER_CACHE_THRESHOLD")
+    p.add_argument("--capacity", type=int, default=500)
+    p.add_argument("--passes", type=int, default=2)
+    p.set_defaults(func=run_answer_cache)
+
+    p = sub.add_parser("extraction", help="LLM calls avoided by the rule-based reservation extractor")
+    p.add_argument("--rounds", type=int, default=100)
+    p.set_defaults(func=run_extraction)
+
+    p = sub.add_parser("speculative", help="full-path turns: extraction then RAG vs. both at once")
+    p.add_argument("--extract-ms", type=float, default=600)
+    p.add_argument("--rag-ms", type=float, default=1200)
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=run_speculative)
+
+    args = parser.parse_args()
+    args.func(args)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,9 @@ load_dotenv(override=True)
 
 import os
 import sys
-from chatbot import build_rag_chain, get_reply, try_submit_reservation, answer_reservation_status
+from chatbot import get_rag_chain, stream_reply, try_submit_reservation, answer_reservation_status
 from guardrails import redact_sensitive
+from db import init_db, maintain_availability_horizon
 
 
 def main():
@@ -15,7 +16,9 @@ def main():
         print("Set OPENAI_API_KEY in .env or environment.")
         sys.exit(1)
 
-    chain = build_rag_chain()
+    init_db()
+    maintain_availability_horizon()
+    chain = get_rag_chain()
     print("Central Garage parking assistant (Stage 4: LangGraph orchestration).")
     print("Ask about location, hours, prices; or provide reservation details to submit.")
     print("Type 'quit' or 'exit' to end.\n")
@@ -43,9 +46,10 @@ def main():
             continue
 
         _ = redact_sensitive(user_input)
-        reply = get_reply(chain, user_input)
-        print("Assistant:", reply)
-        print()
+        print("Assistant: ", end="", flush=True)
+        for token in stream_reply(chain, user_input):
+            print(token, end="", flush=True)
+        print("\n")
 
     print("Goodbye.")
 
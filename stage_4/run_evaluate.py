@@ -6,10 +6,19 @@ load_dotenv(override=True)
 
 import os
 import sys
-from config import OPENAI_API_KEY
+from config import OPENAI_API_KEY, INTENT_MIN_CONFIDENCE
 from vector_store import get_vector_store
-from chatbot import build_rag_chain, get_reply
-from evaluate import measure_latency_single, evaluate_retrieval
+from chatbot import get_rag_chain, get_reply, stream_reply
+from evaluate import (
+    measure_latency_single,
+    measure_time_to_first_token,
+    evaluate_retrieval,
+    evaluate_intent_router,
+)
+from intent_router import get_intent_router
+from data_gen import INTENT_EVAL_CASES
+from llm_cache import get_llm_cache, llm_cache_disabled
+from answer_cache import get_answer_cache
 
 
 def main():
@@ -18,15 +27,39 @@ def main():
         sys.exit(1)
 
     vs = get_vector_store()
-    chain = build_rag_chain()
+    chain = get_rag_chain()
     latency = measure_latency_single(lambda q: get_reply(chain, q), "What are the working hours?", rounds=3)
     print(f"Latency: avg={latency['avg_seconds']:.3f}s")
+    # Uncached, so every round is a real streamed generation.
+    with llm_cache_disabled():
+        ttft = measure_time_to_first_token(lambda q: stream_reply(chain, q, use_cache=False),
+                                           "What are the working hours?", rounds=3)
+    print(f"Streaming: time to first token avg={ttft['avg_ttft_seconds']:.3f}s "
+          f"(min {ttft['min_ttft_seconds']:.3f}s), full reply avg={ttft['avg_total_seconds']:.3f}s")
     test_cases = [
         {"query": "Where is the parking located?", "relevant_sources": ["location"], "content_marker": "123 Main Street"},
         {"query": "How do I book?", "relevant_sources": ["booking"], "content_marker": "Reservations are subject"},
     ]
     ret = evaluate_retrieval(vs, test_cases, k=3)
     print(f"Avg Recall@3: {ret['avg_recall']:.3f}, Precision@3: {ret['avg_precision']:.3f}")
+    routing = evaluate_intent_router(get_intent_router(), INTENT_EVAL_CASES, min_confidence=INTENT_MIN_CONFIDENCE)
+    print(f"Intent routing accuracy: {routing['accuracy']:.1%} on {len(INTENT_EVAL_CASES)} held-out messages "
+          f"(avg {routing['avg_ms']:.3f}ms, max {routing['max_ms']:.3f}ms); "
+          f"{routing['fallbacks']} below confidence {INTENT_MIN_CONFIDENCE} -> full path")
+    for intent, r in routing["per_intent"].items():
+        print(f"  {intent}: {r['correct']}/{r['cases']}")
+    for miss in routing["misses"]:
+        print(f"  miss: {miss['text']!r} -> {miss['predicted']} ({miss['confidence']:.2f}), expected {miss['expected']}")
+    cache = get_llm_cache()
+    if cache is not None:
+        s = cache.stats()
+        print(f"LLM cache: {s['hits']} hits, {s['misses']} misses (hit rate {s['hit_rate']:.0%}), "
+              f"{s['entries']}/{s['max_entries']} entries")
+    answers = get_answer_cache()
+    if answers is not None:
+        s = answers.stats()
+        print(f"Answer cache: {s['hits']} hits ({s['exact_hits']} exact), {s['misses']} misses "
+              f"(hit rate {s['hit_rate']:.0%}), {s['entries']}/{s['capacity']} entries, {s['evicted']} evicted")
     print("Done.")
 
 
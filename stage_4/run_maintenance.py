@@ -0,0 +1,48 @@
+"""Roll the availability horizon forward and archive old decided requests. Run from stage_4 (e.g. daily from cron): python run_maintenance.py"""
+from serbia_ssl_patch import _patched_create_default_context
+print("SSL certs are patched:", _patched_create_default_context)
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+import argparse
+import time
+
+from config import AVAILABILITY_HORIZON_DAYS, AVAILABILITY_PRUNE_BATCH, ARCHIVE_AFTER_DAYS
+from db import init_db, maintain_availability_horizon, archive_decided_requests
+
+
+def run_once(args):
+    report = maintain_availability_horizon(
+        days=args.days,
+        archive=not args.no_archive,
+        batch_size=args.batch_size,
+        pause_seconds=args.pause,
+    )
+    print(f"Added {report['days_added']} day(s) / {report['rows_added']} rows; "
+          f"pruned {report['days_pruned']} day(s) / {report['rows_deleted']} rows "
+          f"in {report['batches']} batch(es), {report['seconds']:.2f}s")
+    report = archive_decided_requests(older_than_days=args.archive_after_days)
+    print(f"Archived {report['rows_moved']} decided request(s) in {report['batches']} batch(es), "
+          f"{report['seconds']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=AVAILABILITY_HORIZON_DAYS, help="days ahead to keep seeded")
+    parser.add_argument("--batch-size", type=int, default=AVAILABILITY_PRUNE_BATCH, help="max rows deleted per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between delete batches")
+    parser.add_argument("--no-archive", action="store_true", help="drop past days without keeping hourly counts")
+    parser.add_argument("--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="move requests decided this many days ago to reservation_history")
+    parser.add_argument("--every-minutes", type=float, default=0, help="keep running, repeating at this interval")
+    args = parser.parse_args()
+
+    init_db()
+    run_once(args)
+    while args.every_minutes > 0:
+        time.sleep(args.every_minutes * 60)
+        run_once(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ load_dotenv(override=True)
 
 import os
 import sys
-from graph import run_user_turn
+from graph import stream_user_turn, warmup
+from db import init_db, maintain_availability_horizon
 
 
 def main():
@@ -14,6 +15,9 @@ def main():
         print("Set OPENAI_API_KEY in .env or environment.")
         sys.exit(1)
 
+    init_db()
+    maintain_availability_horizon()
+    warmup()
     print("Central Garage (Stage 4: LangGraph orchestration). Each message goes through the pipeline.")
     print("Ask about location, hours, prices; or submit a reservation. Type 'quit' or 'exit' to end.\n")
 
@@ -27,9 +31,10 @@ def main():
         if user_input.lower() in ("quit", "exit", "q"):
             break
 
-        reply = run_user_turn(user_input)
-        print("Assistant:", reply)
-        print()
+        print("Assistant: ", end="", flush=True)
+        for token in stream_user_turn(user_input):
+            print(token, end="", flush=True)
+        print("\n")
 
     print("Goodbye.")
 
@@ -1,12 +1,19 @@
 """FastAPI server: POST /confirmed writes to file (MCP-style)."""
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import FastAPI, Header, HTTPException, Depends
+from fastapi import FastAPI, Header, HTTPException, Depends, Query
 from pydantic import BaseModel
 
 from config import RESERVATION_SERVER_API_KEY, CONFIRMED_RESERVATIONS_FILE
-from reservation_writer import write_confirmed_reservation
+from reservation_writer import write_confirmed_reservation, write_confirmed_reservations
+from db import (
+    get_pending_reservation_requests_page,
+    get_prices,
+    get_working_hours,
+    set_prices,
+    set_working_hours,
+)
 
 app = FastAPI(title="Reservation Writer", description="Stage 4: process confirmed reservations to file")
 
@@ -20,6 +27,23 @@ class ConfirmedBody(BaseModel):
     approval_time: Optional[str] = None
 
 
+class ConfirmedBatchBody(BaseModel):
+    items: List[ConfirmedBody]
+
+
+class PriceItem(BaseModel):
+    type: str
+    first_hour: float
+    next_hours: float
+    day_max: float
+
+
+class WorkingHoursItem(BaseModel):
+    day: str
+    open: str
+    close: str
+
+
 def require_api_key(x_api_key: Optional[str] = Header(None)):
     if not RESERVATION_SERVER_API_KEY:
         return
@@ -42,6 +66,58 @@ def post_confirmed(body: ConfirmedBody, _: str = Depends(require_api_key)):
     return {"status": "written", "file": path}
 
 
+@app.post("/confirmed/batch")
+def post_confirmed_batch(body: ConfirmedBatchBody, _: str = Depends(require_api_key)):
+    now = datetime.utcnow().isoformat()
+    rows = [{**item.dict(), "approval_time": item.approval_time or now} for item in body.items]
+    path = write_confirmed_reservations(rows) if rows else CONFIRMED_RESERVATIONS_FILE
+    return {"status": "written", "count": len(rows), "file": path}
+
+
+def _decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    created_at, sep, request_id = cursor.rpartition("|")
+    if not sep or not request_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, int(request_id)
+
+
+@app.get("/reservations/pending")
+def get_pending(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    _: str = Depends(require_api_key),
+):
+    """Pending requests oldest first, one keyset page at a time; pass next_cursor back to continue."""
+    rows, after = get_pending_reservation_requests_page(after=_decode_cursor(cursor), limit=limit)
+    return {"items": rows, "next_cursor": f"{after[0]}|{after[1]}" if after else None}
+
+
+@app.get("/admin/prices")
+def admin_get_prices(_: str = Depends(require_api_key)):
+    return {"items": get_prices()}
+
+
+@app.put("/admin/prices")
+def admin_put_prices(items: List[PriceItem], _: str = Depends(require_api_key)):
+    """Replace all prices; every worker's cache is invalidated."""
+    set_prices([item.dict() for item in items])
+    return {"status": "updated", "count": len(items)}
+
+
+@app.get("/admin/working-hours")
+def admin_get_working_hours(_: str = Depends(require_api_key)):
+    return {"items": get_working_hours()}
+
+
+@app.put("/admin/working-hours")
+def admin_put_working_hours(items: List[WorkingHoursItem], _: str = Depends(require_api_key)):
+    """Replace all working hours; every worker's cache is invalidated."""
+    set_working_hours([item.dict() for item in items])
+    return {"status": "updated", "count": len(items)}
+
+
 @app.get("/health")
 def health():
     return {"status": "ok", "file": CONFIRMED_RESERVATIONS_FILE}